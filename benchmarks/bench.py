@@ -0,0 +1,252 @@
+# bench.py
+# 针对本地模拟服务的端到端吞吐量基准测试，结果保存为 JSON 以便在不同版本之间比较。
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+import pysubs2
+
+import config_manager
+from pipeline import ConsoleReporter, run_translation_job, apply_runtime_config, build_system_prompt
+from translator import translate_batch
+from mock_server import MockBehavior, MockServer
+
+SCENARIOS = {
+    "baseline": {"server": {}, "job": {}},
+    "async": {"server": {}, "job": {"use_async_engine": True}},
+    "streaming": {"server": {"tokens_per_second": 400}, "job": {"stream_output": True}},
+    "errors": {"server": {"rate_429": 0.05, "rate_500": 0.03}, "job": {}},
+    "misnumbered": {"server": {"drop_line": 0.02, "misnumber_line": 0.01}, "job": {}},
+    "tail": {"server": {"slow_ratio": 0.05}, "job": {"hedge_requests": True}}
+}
+
+WORDS = (
+    "we need to get out of here before the storm hits the city and nobody knows "
+    "where the captain went last night but I think she left a message for you"
+).split()
+
+class QuietReporter(ConsoleReporter):
+    def __init__(self):
+        super().__init__()
+        self.errors = []
+
+    def status(self, text):
+        pass
+
+    def progress(self, value, maximum):
+        pass
+
+    def info(self, title, message):
+        pass
+
+    def warning(self, title, message):
+        pass
+
+    def error(self, title, message):
+        self.errors.append(f"{title}: {message}")
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))).capitalize() + rng.choice(".?!")
+
+def generate_subtitles(path: str, lines: int, seed: int = 0):
+    rng = random.Random(seed)
+    subs = pysubs2.SSAFile()
+    is_ass = path.endswith(".ass")
+    for i in range(lines):
+        text = _sentence(rng)
+        if rng.random() < 0.2:
+            text += r"\N" + _sentence(rng)
+        if is_ass and rng.random() < 0.3:
+            text = r"{\pos(%d,%d)\fad(120,120)}" % (rng.randint(0, 1280), rng.randint(0, 720)) + text
+        event = pysubs2.SSAEvent(start=i * 2000, end=i * 2000 + 1800, text=text)
+        if is_ass and rng.random() < 0.05:
+            event.type = "Comment"
+        subs.append(event)
+    subs.save(path)
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+def _latency_summary(durations) -> dict:
+    return {
+        "window_p50": round(percentile(durations, 0.5), 4),
+        "window_p99": round(percentile(durations, 0.99), 4),
+        "window_max": round(max(durations, default=0.0), 4)
+    }
+
+def run_batch(api_base: str, texts, window_size: int, concurrency: int, retries: int, system_prompt: str, stream: bool = False) -> dict:
+    windows = [texts[i:i + window_size] for i in range(0, len(texts), window_size)]
+
+    def translate(window):
+        stats = {}
+        start = time.time()
+        _, warning_msg = translate_batch(window, "sk-bench", api_base, "mock-model", system_prompt,
+                                         temperature=1.0, max_retries=retries, stats=stats, stream=stream)
+        return time.time() - start, stats, warning_msg
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(translate, windows))
+    seconds = time.time() - start
+    return {
+        "lines": len(texts),
+        "windows": len(windows),
+        "seconds": round(seconds, 3),
+        "lines_per_second": round(len(texts) / seconds, 2),
+        **_latency_summary([duration for duration, _, _ in outcomes]),
+        "retries": sum(max(0, stats.get("attempts", 1) - 1) for _, stats, _ in outcomes),
+        "rate_limited": sum(stats.get("rate_limited", 0) for _, stats, _ in outcomes),
+        "failed_windows": sum(1 for _, _, warning_msg in outcomes if warning_msg),
+        "prompt_tokens": sum(stats.get("prompt_tokens", 0) for _, stats, _ in outcomes),
+        "cached_tokens": sum(stats.get("cached_tokens", 0) for _, stats, _ in outcomes)
+    }
+
+def run_job(api_base: str, input_path: str, output_path: str, window_size: int, concurrency: int, retries: int,
+            system_prompt: str, job_options: dict) -> dict:
+    options = {
+        "use_async_engine": False, "source_language": "英语", "target_language": "简体中文",
+        "use_translation_memory": False, "deduplicate_lines": True, "adaptive_window": False,
+        "token_budget": 0, "stream_output": False, "resume": False, "hedge_requests": False,
+        **job_options
+    }
+    reporter = QuietReporter()
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run_translation_job(input_path, output_path, window_size, 1.0, api_base, "sk-bench", "mock-model",
+                                     system_prompt, retries, concurrency, reporter=reporter, **options)
+    seconds = time.time() - start
+    windows = (result["usage"] or {}).get("windows", [])
+    return {
+        "status": result["status"],
+        "error": result["error"],
+        "lines": result["lines"],
+        "api_lines": result["api_lines"],
+        "windows": len(result["window_seconds"]),
+        "seconds": round(seconds, 3),
+        "translation_seconds": round(result["translation_seconds"], 3),
+        "lines_per_second": round(result["lines"] / seconds, 2),
+        **_latency_summary(result["window_seconds"]),
+        "retries": sum(max(0, w["attempts"] - 1) for w in windows),
+        "failed_windows": result["failed_windows"],
+        "prompt_tokens": result["prompt_tokens"],
+        "cached_tokens": result["cached_tokens"]
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def _print_table(results):
+    print("\n场景\t模式\t文件\t行/秒\tp50(秒)\tp99(秒)\t重试\t失败窗口")
+    for r in results:
+        print(f"{r['scenario']}\t{r['mode']}\t{r['file']}\t{r['lines_per_second']}\t{r['window_p50']}\t{r['window_p99']}\t{r['retries']}\t{r['failed_windows']}")
+
+def _print_comparison(results, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["mode"], r["file"]): r for r in json.load(f)["results"]}
+    print(f"\n与 {baseline_path} 比较（行/秒、p99 的变化）：")
+    for r in results:
+        old = baseline.get((r["scenario"], r["mode"], r["file"]))
+        if not old:
+            continue
+        speedup = r["lines_per_second"] / old["lines_per_second"] if old["lines_per_second"] else 0.0
+        print(f"{r['scenario']}\t{r['mode']}\t{r['file']}\t{old['lines_per_second']} -> {r['lines_per_second']}（{speedup:.2f}x）\t"
+              f"p99 {old['window_p99']} -> {r['window_p99']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EzSubTrans 吞吐量基准测试（使用本地模拟服务，不消耗真实 API）")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"逗号分隔，可选：{','.join(SCENARIOS)}")
+    parser.add_argument("--modes", default="batch,job", help="batch：直接调用 translate_batch；job：完整翻译流程（run_translation_job）")
+    parser.add_argument("--sizes", default="500,2000", help="合成字幕的行数，逗号分隔")
+    parser.add_argument("--formats", default="srt,ass")
+    parser.add_argument("--window-size", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--latency-median", type=float, default=0.2, help="模拟服务的响应耗时中位数（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 比较")
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    formats = [fmt.strip() for fmt in args.formats.split(",")]
+    system_prompt = build_system_prompt("英语", "简体中文")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ezsubtrans-bench-") as work_dir:
+        config_manager.CONFIG_FILE = os.path.join(work_dir, "config.json")
+        bench_config = {
+            "translation_memory": {"enabled": False},
+            "checkpoint_dir": os.path.join(work_dir, "checkpoints"),
+            "hedging": {"min_samples": 5, "min_delay": 0.2, "max_hedge_ratio": 0.1},
+            "http_pool": {"http2": False}
+        }
+        with open(config_manager.CONFIG_FILE, "w", encoding="utf-8") as f:
+            json.dump(bench_config, f)
+        apply_runtime_config(bench_config)
+
+        files = []
+        for size in sizes:
+            for fmt in formats:
+                path = os.path.join(work_dir, f"synthetic_{size}.{fmt}")
+                generate_subtitles(path, size, args.seed)
+                files.append(path)
+
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            for mode in modes:
+                for path in files:
+                    behavior = MockBehavior(latency_median=args.latency_median, seed=args.seed, **scenario["server"])
+                    with MockServer(behavior) as server:
+                        if mode == "batch":
+                            texts = [line.text for line in pysubs2.load(path)]
+                            measured = run_batch(server.api_base, texts, args.window_size, args.concurrency, args.retries, system_prompt,
+                                                 scenario["job"].get("stream_output", False))
+                        else:
+                            output_path = path.replace(".", "_out.", 1)
+                            measured = run_job(server.api_base, path, output_path, args.window_size, args.concurrency,
+                                               args.retries, system_prompt, scenario["job"])
+                    entry = {"scenario": name, "mode": mode, "file": os.path.basename(path), **measured, "server": dict(behavior.counters)}
+                    results.append(entry)
+                    print(f"{name}/{mode}/{entry['file']}: {entry['lines_per_second']} 行/秒，p50 {entry['window_p50']} 秒，"
+                          f"p99 {entry['window_p99']} 秒，重试 {entry['retries']}")
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _print_table(results)
+    print(f"\n结果已保存至 {args.output}")
+    if args.compare:
+        _print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
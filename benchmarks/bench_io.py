@@ -0,0 +1,193 @@
+# bench_io.py
+# 大文件读写基准：比较 pysubs2 整体加载/保存与流式读写在不同事件数下的解析耗时、保存耗时与峰值内存。
+# 每项测量在独立子进程中进行，峰值 RSS 互不影响。
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+MODES = ("pysubs2", "streaming")
+
+WORDS = (
+    "we need to get out of here before the storm hits the city and nobody knows "
+    "where the captain went last night but I think she left a message for you"
+).split()
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,48,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+def _timestamp(ms: int, srt: bool) -> str:
+    h, ms = divmod(ms, 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}" if srt else f"{h:d}:{m:02d}:{s:02d}.{ms // 10:02d}"
+
+# 直接逐行写出合成字幕，避免生成百万行文件时本身占用大量内存
+def generate_large_subtitles(path: str, events: int, seed: int = 0):
+    rng = random.Random(seed)
+    srt = path.endswith(".srt")
+    # ASS 时间戳最大为 9:59:59.99，事件过多时压缩间隔
+    step = max(20, min(1000, 35_000_000 // max(events, 1)))
+    with open(path, "w", encoding="utf-8") as f:
+        if not srt:
+            f.write(ASS_HEADER)
+        for i in range(events):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))).capitalize()
+            start, end = _timestamp(i * step, srt), _timestamp(i * step + step * 9 // 10, srt)
+            if srt:
+                f.write(f"{i + 1}\n{start} --> {end}\n{text}\n\n")
+            else:
+                if rng.random() < 0.2:
+                    text = r"{\i1}" + text + r"{\i0}"
+                event_type = "Comment" if rng.random() < 0.05 else "Dialogue"
+                f.write(f"{event_type}: 0,{start},{end},Default,,0,0,0,,{text}\n")
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def run_child(mode: str, input_path: str, output_path: str, chunk_events: int) -> dict:
+    from subtitle_parser import load_subtitles, save_subtitles, select_translatable_events
+    from subtitle_stream import load_subtitles_streaming, save_subtitles_streaming
+    baseline_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if mode == "streaming":
+        # 流式读取在解析时一并筛选事件
+        subs, texts = load_subtitles_streaming(input_path, chunk_events, {})
+        line_indices = subs.line_indices
+    else:
+        subs, texts = load_subtitles(input_path, use_cache=False)
+    parse_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode != "streaming":
+        line_indices, _ = select_translatable_events(subs)
+        texts = [texts[i] for i in line_indices]
+    select_seconds = time.perf_counter() - start
+    translated_texts = ["译：" + text for text in texts]
+
+    start = time.perf_counter()
+    save = save_subtitles_streaming if mode == "streaming" else save_subtitles
+    save(subs, output_path, translated_texts, len(line_indices), line_indices)
+    save_seconds = time.perf_counter() - start
+    return {
+        "events": len(subs),
+        "translated": len(line_indices),
+        "parse_seconds": round(parse_seconds, 3),
+        "select_seconds": round(select_seconds, 3),
+        "save_seconds": round(save_seconds, 3),
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+def measure(mode: str, input_path: str, output_path: str, chunk_events: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, input_path, output_path, "--chunk-events", str(chunk_events)],
+        capture_output=True, text=True, encoding="utf-8"
+    )
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"退出码 {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def _print_comparison(results, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["mode"], r["file"]): r for r in json.load(f)["results"]}
+    print(f"\n与 {baseline_path} 比较（解析、保存耗时与峰值内存的变化）：")
+    for r in results:
+        old = baseline.get((r["mode"], r["file"]))
+        if not old or "error" in old or "error" in r:
+            continue
+        print(f"{r['mode']}\t{r['file']}\t解析 {old['parse_seconds']} -> {r['parse_seconds']} 秒\t"
+              f"保存 {old['save_seconds']} -> {r['save_seconds']} 秒\t峰值 {old['peak_rss_mb']} -> {r['peak_rss_mb']} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EzSubTrans 大文件读写基准测试")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="合成字幕的事件数，逗号分隔")
+    parser.add_argument("--formats", default="srt,ass")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"逗号分隔，可选：{','.join(MODES)}")
+    parser.add_argument("--chunk-events", type=int, default=5000, help="流式读写每块的事件数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="bench_io_results.json")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 比较")
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "INPUT", "OUTPUT"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, input_path, output_path = args.child
+        print(json.dumps(run_child(mode, input_path, output_path, args.chunk_events)))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"未知模式: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+    formats = [fmt.strip() for fmt in args.formats.split(",")]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ezsubtrans-bench-io-") as work_dir:
+        for size in sizes:
+            for fmt in formats:
+                input_path = os.path.join(work_dir, f"synthetic_{size}.{fmt}")
+                generate_large_subtitles(input_path, size, args.seed)
+                file_mb = round(os.path.getsize(input_path) / (1024 * 1024), 1)
+                for mode in modes:
+                    output_path = os.path.join(work_dir, f"synthetic_{size}_{mode}_out.{fmt}")
+                    entry = {"mode": mode, "file": os.path.basename(input_path), "file_mb": file_mb,
+                             **measure(mode, input_path, output_path, args.chunk_events)}
+                    results.append(entry)
+                    if "error" in entry:
+                        print(f"{mode}/{entry['file']}: 出错 {entry['error']}")
+                    else:
+                        print(f"{mode}/{entry['file']}（{file_mb} MB）：解析 {entry['parse_seconds']} 秒，"
+                              f"保存 {entry['save_seconds']} 秒，峰值内存 {entry['peak_rss_mb']} MB")
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                os.remove(input_path)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "child")},
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存至 {args.output}")
+    if args.compare:
+        _print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# mock_server.py
+# 本地模拟的 OpenAI 兼容 /v1/chat/completions 服务，用于吞吐量基准测试。
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LINE_PATTERN = re.compile(r"^\[(\d+)]\s*(.*)$", re.MULTILINE)
+
+class MockBehavior:
+    def __init__(
+        self,
+        latency: str = "lognormal",
+        latency_median: float = 0.2,
+        latency_sigma: float = 0.5,
+        latency_max: float = 2.0,
+        slow_ratio: float = 0.0,
+        slow_factor: float = 10.0,
+        tokens_per_second: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: float = 0.5,
+        rate_500: float = 0.0,
+        drop_line: float = 0.0,
+        misnumber_line: float = 0.0,
+        seed=None
+    ):
+        self.latency = latency
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.latency_max = latency_max
+        self.slow_ratio = slow_ratio
+        self.slow_factor = slow_factor
+        self.tokens_per_second = tokens_per_second
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rate_500 = rate_500
+        self.drop_line = drop_line
+        self.misnumber_line = misnumber_line
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "responses_429": 0, "responses_500": 0, "dropped_lines": 0, "misnumbered_lines": 0}
+        self.seen_prefixes = set()
+
+    def roll(self, probability: float) -> bool:
+        with self.lock:
+            return self.random.random() < probability
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def sample_latency(self) -> float:
+        with self.lock:
+            if self.latency == "fixed":
+                latency = self.latency_median
+            elif self.latency == "uniform":
+                latency = self.random.uniform(0, 2 * self.latency_median)
+            else:
+                latency = self.random.lognormvariate(math.log(self.latency_median), self.latency_sigma)
+            latency = min(latency, self.latency_max)
+            if self.random.random() < self.slow_ratio:
+                latency *= self.slow_factor
+        return latency
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text.encode("utf-8")) / 3.5))
+
+def _mock_translate(behavior: MockBehavior, user_content: str) -> str:
+    # 仅处理最后的“请翻译下列各行”部分，补译请求中的上下文行不输出
+    if "请翻译下列各行：" in user_content:
+        user_content = user_content.split("请翻译下列各行：", 1)[1]
+    lines = LINE_PATTERN.findall(user_content)
+    if not lines:
+        return "这是一段模拟的内容摘要。"
+    output = []
+    for number, text in lines:
+        if behavior.roll(behavior.drop_line):
+            behavior.count("dropped_lines")
+            continue
+        if behavior.roll(behavior.misnumber_line):
+            behavior.count("misnumbered_lines")
+            number = str(int(number) + len(lines))
+        output.append(f"[{number}] 译：{text}")
+    return "\n".join(output)
+
+def make_handler(behavior: MockBehavior):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            behavior.count("requests")
+            if behavior.roll(behavior.rate_429):
+                behavior.count("responses_429")
+                self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_exceeded"}},
+                                {"Retry-After": str(behavior.retry_after)})
+                return
+            if behavior.roll(behavior.rate_500):
+                behavior.count("responses_500")
+                time.sleep(behavior.sample_latency() / 2)
+                self._send_json(500, {"error": {"message": "internal error", "type": "server_error"}})
+                return
+
+            messages = body.get("messages", [])
+            system_prompt = messages[0]["content"] if messages else ""
+            content = _mock_translate(behavior, messages[-1]["content"] if messages else "")
+            prompt_tokens = sum(_estimate_tokens(m["content"]) for m in messages)
+            with behavior.lock:
+                cached_tokens = _estimate_tokens(system_prompt) if system_prompt in behavior.seen_prefixes else 0
+                behavior.seen_prefixes.add(system_prompt)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": _estimate_tokens(content),
+                "total_tokens": prompt_tokens + _estimate_tokens(content),
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+            time.sleep(behavior.sample_latency())
+            if body.get("stream"):
+                self._stream(body, content, usage)
+            else:
+                if behavior.tokens_per_second:
+                    time.sleep(usage["completion_tokens"] / behavior.tokens_per_second)
+                self._send_json(200, {
+                    "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model", ""),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage
+                })
+
+        def _stream(self, body: dict, content: str, usage: dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send_event(payload: dict):
+                data = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+            def chunk(delta: dict, finish_reason=None, chunk_usage=None):
+                return {
+                    "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", ""),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if chunk_usage is None else [],
+                    "usage": chunk_usage
+                }
+
+            piece_chars = 8
+            piece_seconds = _estimate_tokens("x" * piece_chars) / behavior.tokens_per_second if behavior.tokens_per_second else 0
+            try:
+                for start in range(0, len(content), piece_chars):
+                    send_event(chunk({"content": content[start:start + piece_chars]}))
+                    if piece_seconds:
+                        time.sleep(piece_seconds)
+                send_event(chunk({}, "stop"))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send_event(chunk({}, chunk_usage=usage))
+                data = b"data: [DONE]\n\n"
+                self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+class MockServer:
+    def __init__(self, behavior: MockBehavior, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(behavior))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="mock-server", daemon=True)
+
+    @property
+    def api_base(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--latency-median", type=float, default=0.2)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--slow-ratio", type=float, default=0.0)
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--drop-line", type=float, default=0.0)
+    parser.add_argument("--misnumber-line", type=float, default=0.0)
+    args = parser.parse_args()
+    behavior = MockBehavior(
+        latency=args.latency, latency_median=args.latency_median, latency_sigma=args.latency_sigma,
+        slow_ratio=args.slow_ratio, slow_factor=args.slow_factor, tokens_per_second=args.tokens_per_second,
+        rate_429=args.rate_429, rate_500=args.rate_500, drop_line=args.drop_line, misnumber_line=args.misnumber_line
+    )
+    with MockServer(behavior, args.host, args.port) as server:
+        print(f"模拟服务已启动：{server.api_base}（Ctrl+C 退出）")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# backend_pool.py
+import asyncio
+import threading
+import time
+from typing import List, Optional
+
+STRATEGIES = ("least_outstanding", "latency")
+
+class NoBackendAvailableError(Exception):
+    pass
+
+class Backend:
+    def __init__(self, api_base: str, api_key: str, model: str, name: str = "", weight: float = 1.0, max_concurrency: int = 4,
+                 rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.api_base = api_base
+        self.api_key = api_key
+        self.model = model
+        self.name = name or f"{model}@{api_base}"
+        self.weight = max(weight, 0.01)
+        self.max_concurrency = max(1, max_concurrency)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.outstanding = 0
+        self.completed = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.seconds_per_line = None
+
+class BackendPool:
+    def __init__(self, backends: List[Backend], strategy: str = "least_outstanding", eject_after: int = 3, eject_seconds: float = 60.0):
+        if not backends:
+            raise ValueError("后端列表不能为空")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"未知的调度策略: {strategy}")
+        self.backends = backends
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._condition = threading.Condition()
+
+    @property
+    def total_concurrency(self) -> int:
+        return sum(b.max_concurrency for b in self.backends)
+
+    def _score(self, backend: Backend) -> float:
+        load = (backend.outstanding + 1) / backend.weight
+        if self.strategy == "latency":
+            return (backend.seconds_per_line or 0.0) * load
+        return load
+
+    def try_acquire(self, exclude=()) -> Optional[Backend]:
+        with self._condition:
+            now = time.monotonic()
+            candidates = [
+                b for b in self.backends
+                if b not in exclude and b.ejected_until <= now
+                and b.outstanding < b.max_concurrency
+            ]
+            if not candidates:
+                return None
+            backend = min(candidates, key=self._score)
+            backend.outstanding += 1
+            return backend
+
+    def _has_candidates(self, exclude) -> bool:
+        return any(b not in exclude for b in self.backends)
+
+    def _next_wakeup(self) -> float:
+        now = time.monotonic()
+        waits = [b.ejected_until - now for b in self.backends if b.ejected_until > now]
+        return min(waits + [1.0])
+
+    def acquire(self, exclude=()) -> Backend:
+        if not self._has_candidates(exclude):
+            raise NoBackendAvailableError("没有可用的后端")
+        while True:
+            backend = self.try_acquire(exclude)
+            if backend:
+                return backend
+            with self._condition:
+                self._condition.wait(timeout=self._next_wakeup())
+
+    async def acquire_async(self, exclude=()) -> Backend:
+        if not self._has_candidates(exclude):
+            raise NoBackendAvailableError("没有可用的后端")
+        while True:
+            backend = self.try_acquire(exclude)
+            if backend:
+                return backend
+            await asyncio.sleep(min(self._next_wakeup(), 0.05))
+
+    def release(self, backend: Backend, duration: float, lines: int, ok: bool):
+        with self._condition:
+            backend.outstanding -= 1
+            if ok:
+                backend.completed += 1
+                backend.consecutive_failures = 0
+                seconds_per_line = duration / max(lines, 1)
+                if backend.seconds_per_line is None:
+                    backend.seconds_per_line = seconds_per_line
+                else:
+                    backend.seconds_per_line = 0.8 * backend.seconds_per_line + 0.2 * seconds_per_line
+            else:
+                backend.failed += 1
+                backend.consecutive_failures += 1
+                now = time.monotonic()
+                others_healthy = any(b is not backend and b.ejected_until <= now for b in self.backends)
+                if backend.consecutive_failures >= self.eject_after and others_healthy:
+                    backend.ejected_until = now + self.eject_seconds
+                    backend.ejections += 1
+                    print(f"后端 {backend.name} 连续失败 {backend.consecutive_failures} 次，暂停使用 {self.eject_seconds:.0f} 秒")
+            self._condition.notify_all()
+
+    def cancel(self, backend: Backend):
+        with self._condition:
+            backend.outstanding -= 1
+            self._condition.notify_all()
+
+    def has_healthy(self, exclude=()) -> bool:
+        now = time.monotonic()
+        with self._condition:
+            return any(b not in exclude and b.ejected_until <= now for b in self.backends)
+
+    @property
+    def model_label(self) -> str:
+        return ",".join(sorted({b.model for b in self.backends}))
+
+    def describe(self) -> str:
+        with self._condition:
+            parts = []
+            for b in self.backends:
+                latency = f"{b.seconds_per_line:.2f} 秒/行" if b.seconds_per_line is not None else "无数据"
+                parts.append(f"{b.name}: 完成 {b.completed}，失败 {b.failed}，剔除 {b.ejections} 次，{latency}")
+            return "后端统计：\n  " + "\n  ".join(parts)
+
+def build_backend_pool(
+    backend_configs: List[dict],
+    api_base: str,
+    api_key: str,
+    model: str,
+    concurrency: int,
+    strategy: str = "least_outstanding",
+    eject_after: int = 3,
+    eject_seconds: float = 60.0
+) -> BackendPool:
+    if not backend_configs:
+        backends = [Backend(api_base, api_key, model, max_concurrency=concurrency)]
+    else:
+        backends = [
+            Backend(
+                api_base=c.get("api_base", api_base),
+                api_key=c.get("api_key", api_key),
+                model=c.get("model", model),
+                name=c.get("name", ""),
+                weight=c.get("weight", 1.0),
+                max_concurrency=c.get("max_concurrency", concurrency),
+                rpm=c.get("rpm"),
+                tpm=c.get("tpm")
+            )
+            for c in backend_configs
+            if c.get("enabled", True)
+        ]
+    return BackendPool(backends, strategy, eject_after, eject_seconds)
@@ -0,0 +1,99 @@
+# batching.py
+import math
+import re
+import threading
+from collections import deque
+from typing import Iterator, List, Optional
+
+_WIDE_CHAR_PATTERN = re.compile(r"[\u1100-\u11ff\u2e80-\u9fff\ua960-\ua97f\uac00-\ud7ff\uf900-\ufaff\uff00-\uffef]")
+
+def estimate_tokens(text: str) -> int:
+    wide = len(_WIDE_CHAR_PATTERN.findall(text))
+    narrow = len(text) - wide
+    return wide + math.ceil(narrow / 3.5)
+
+def estimate_line_tokens(position: int, text: str) -> int:
+    return estimate_tokens(f"[{position}] {text}") + 1
+
+class FixedWindowSizer:
+    def __init__(self, size: int):
+        self.size = size
+
+    def next_size(self) -> int:
+        return self.size
+
+    def record(self, size: int, duration: float, stats: dict, warning_msg=None):
+        pass
+
+    def describe(self) -> str:
+        return f"固定窗口大小 {self.size}"
+
+class AdaptiveWindowSizer:
+    def __init__(self, initial_size: int, min_size: int = 5, max_size: int = 60, history: int = 8):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = min(max(initial_size, self.min_size), self.max_size)
+        self.best_seconds_per_line = None
+        self.chosen_sizes = []
+        self._recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def next_size(self) -> int:
+        with self._lock:
+            self.chosen_sizes.append(self.size)
+            return self.size
+
+    def record(self, size: int, duration: float, stats: dict, warning_msg=None):
+        clean = not warning_msg and stats.get("attempts", 1) <= 1
+        truncated = stats.get("truncated", False)
+        seconds_per_line = duration / max(size, 1)
+
+        with self._lock:
+            self._recent.append(clean and not truncated)
+            success_rate = sum(self._recent) / len(self._recent)
+
+            if truncated:
+                self.size = max(self.min_size, min(self.size, size) // 2)
+            elif not clean:
+                self.size = max(self.min_size, int(min(self.size, size) * 0.75))
+            elif size >= self.size:
+                if self.best_seconds_per_line is None or seconds_per_line < self.best_seconds_per_line:
+                    self.best_seconds_per_line = seconds_per_line
+                if seconds_per_line <= self.best_seconds_per_line * 1.1 and success_rate >= 0.9:
+                    self.size = min(self.max_size, self.size + max(1, self.size // 4))
+                elif seconds_per_line > self.best_seconds_per_line * 1.3:
+                    self.size = max(self.min_size, self.size - max(1, self.size // 8))
+
+    def describe(self) -> str:
+        with self._lock:
+            if not self.chosen_sizes:
+                return f"自适应窗口：当前 {self.size} 行"
+            average = sum(self.chosen_sizes) / len(self.chosen_sizes)
+            return (f"自适应窗口：当前 {self.size} 行，平均 {average:.1f} 行，"
+                    f"范围 {min(self.chosen_sizes)} - {max(self.chosen_sizes)} 行")
+
+def iter_windows(
+    indices: List[int],
+    sizer,
+    texts: Optional[List[str]] = None,
+    token_budget: int = 0,
+    prompt_tokens: int = 0
+) -> Iterator[List[int]]:
+    position = 0
+    while position < len(indices):
+        size = sizer.next_size()
+        if not token_budget:
+            yield indices[position : position + size]
+            position += size
+            continue
+
+        window = []
+        used_tokens = prompt_tokens
+        while position < len(indices) and len(window) < size:
+            line_tokens = estimate_line_tokens(len(window) + 1, texts[indices[position]])
+            if window and used_tokens + line_tokens > token_budget:
+                break
+            window.append(indices[position])
+            used_tokens += line_tokens
+            position += 1
+        yield window
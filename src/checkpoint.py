@@ -0,0 +1,93 @@
+# checkpoint.py
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict
+
+CHECKPOINT_DIR = "checkpoints"
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def job_key(input_path: str, settings: dict) -> str:
+    payload = json.dumps({"file": file_hash(input_path), "settings": settings}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+class CheckpointJournal:
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = input_path
+        self._lock = threading.Lock()
+        self._file = None
+        self.summary = None
+
+    def load(self) -> Dict[int, str]:
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "summary" in record:
+                    self.summary = record["summary"]
+                for index, translation in record.get("lines", {}).items():
+                    entries[int(index)] = translation
+        return entries
+
+    def append(self, lines: Dict[int, str]):
+        if not lines:
+            return
+        self._write({"time": time.time(), "lines": {str(k): v for k, v in lines.items()}})
+
+    def append_summary(self, summary: str):
+        self.summary = summary
+        self._write({"time": time.time(), "summary": summary})
+
+    def _write(self, entry: dict):
+        record = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                self._open_for_append()
+            self._file.write(record + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _open_for_append(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        torn_tail = False
+        if not new_file:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn_tail = f.read(1) != b"\n"
+        self._file = open(self.path, "a", encoding="utf-8")
+        if new_file:
+            self._file.write(json.dumps({"input": self.input_path, "created": time.time()}, ensure_ascii=False) + "\n")
+        elif torn_tail:
+            self._file.write("\n")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def open_journal(input_path: str, settings: dict, directory: str = CHECKPOINT_DIR, resume: bool = True) -> CheckpointJournal:
+    os.makedirs(directory, exist_ok=True)
+    journal = CheckpointJournal(os.path.join(directory, f"{job_key(input_path, settings)}.jsonl"), input_path)
+    if not resume:
+        journal.discard()
+    return journal
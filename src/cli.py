@@ -0,0 +1,230 @@
+# cli.py
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import config_manager
+from config_manager import load_config, DEFAULT_CONFIG
+from pipeline import ConsoleReporter, run_translation_job, apply_runtime_config, build_system_prompt, default_output_path
+from usage import merge_usage_reports, write_usage_report
+
+SUBTITLE_EXTENSIONS = (".srt", ".ass")
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INCOMPLETE = 3
+EXIT_BUDGET = 4
+EXIT_INTERRUPTED = 130
+
+_reporter = None
+
+def _request_stop(signum, frame):
+    if _reporter:
+        _reporter.stop_requested = True
+
+def _init_worker(config_file, metrics_port=None, worker_counter=None):
+    config_manager.CONFIG_FILE = config_file
+    signal.signal(signal.SIGINT, _request_stop)
+    config = load_config()
+    if metrics_port:
+        offset = 0
+        if worker_counter is not None:
+            with worker_counter.get_lock():
+                offset = worker_counter.value
+                worker_counter.value += 1
+        config["metrics"] = {**config.get("metrics", {}), "enabled": True, "port": metrics_port + offset}
+    apply_runtime_config(config)
+
+def _translate_file(task):
+    global _reporter
+    input_path, output_path, job_args = task
+    _reporter = ConsoleReporter(prefix=f"[{os.path.basename(input_path)}] ")
+    start_time = time.time()
+    result = run_translation_job(input_path, output_path, *job_args, reporter=_reporter)
+    result["seconds"] = time.time() - start_time
+    return result
+
+def _is_translation_output(path, target_language):
+    stem = os.path.splitext(path)[0]
+    output_stem = os.path.splitext(default_output_path(path, target_language))[0]
+    return stem.endswith("_partial") or stem.endswith(output_stem[len(stem):])
+
+def collect_inputs(patterns, target_language):
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(d, f) for d, _, files in os.walk(pattern) for f in sorted(files)]
+        elif glob.has_magic(pattern):
+            candidates = sorted(glob.glob(pattern, recursive=True))
+        else:
+            found.append(pattern)
+            continue
+        found.extend(
+            p for p in candidates
+            if p.lower().endswith(SUBTITLE_EXTENSIONS) and not _is_translation_output(p, target_language)
+        )
+    unique = []
+    for path in found:
+        if path not in unique:
+            unique.append(path)
+    return unique
+
+def build_parser(config):
+    parser = argparse.ArgumentParser(description="EzSubTrans 命令行版：翻译 .srt / .ass 字幕文件，支持单个文件、通配符和目录。")
+    parser.add_argument("inputs", nargs="+", help="字幕文件、通配符（如 \"subs/**/*.ass\"）或目录（递归查找 .srt / .ass）")
+    parser.add_argument("-o", "--output", help="输出文件路径，仅在输入为单个文件时可用")
+    parser.add_argument("--output-dir", help="输出目录；输入为目录时保留相对目录结构")
+    parser.add_argument("--config", default=config_manager.CONFIG_FILE, help="配置文件路径（默认 config.json）")
+    parser.add_argument("--api-base", default=config.get("api_base", DEFAULT_CONFIG["api_base"]))
+    parser.add_argument("--api-key", default=config.get("api_key") or os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--model", default=config.get("translation_model", DEFAULT_CONFIG["translation_model"]), help="翻译模型")
+    parser.add_argument("--summary-model", default=config.get("summary_model", DEFAULT_CONFIG["summary_model"]), help="深度理解使用的摘要模型")
+    parser.add_argument("--source-language", default=config.get("source_language", "英语"))
+    parser.add_argument("--target-language", default=config.get("target_language", "简体中文"))
+    parser.add_argument("--context", default="", help="背景描述")
+    parser.add_argument("--deep-summary", action="store_true", help="启用深度理解")
+    parser.add_argument("--window-size", type=int, default=10)
+    parser.add_argument("--temperature", type=float, default=1.3)
+    parser.add_argument("--retries", type=int, default=1, help="最大重试次数")
+    parser.add_argument("--concurrency", type=int, default=config.get("concurrency", DEFAULT_CONFIG["concurrency"]), help="单个文件内的并发窗口数")
+    parser.add_argument("--async-engine", action=argparse.BooleanOptionalAction, default=config.get("async_engine", DEFAULT_CONFIG["async_engine"]))
+    parser.add_argument("--translation-memory", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--dedup", action=argparse.BooleanOptionalAction, default=config.get("deduplicate_lines", DEFAULT_CONFIG["deduplicate_lines"]), help="合并重复行")
+    parser.add_argument("--adaptive-window", action=argparse.BooleanOptionalAction, default=config.get("adaptive_window_enabled", DEFAULT_CONFIG["adaptive_window_enabled"]))
+    parser.add_argument("--token-budget", type=int, default=config.get("token_budget", DEFAULT_CONFIG["token_budget"]))
+    parser.add_argument("--stream", action=argparse.BooleanOptionalAction, default=config.get("stream_output", DEFAULT_CONFIG["stream_output"]), help="流式输出")
+    parser.add_argument("--resume", action=argparse.BooleanOptionalAction, default=True, help="断点续传")
+    parser.add_argument("--hedge", action=argparse.BooleanOptionalAction, default=config.get("hedge_requests", DEFAULT_CONFIG["hedge_requests"]), help="请求对冲")
+    parser.add_argument("--max-tokens", type=int, help="单个文件的 token 上限（提示词 + 输出），超出后停止并保存部分结果")
+    parser.add_argument("--max-cost", type=float, help="单个文件的费用上限（需在 config.json 的 pricing 中配置单价）")
+    parser.add_argument("--usage-json", help="将本次运行的 token 用量与费用（按文件和窗口）导出为 JSON")
+    parser.add_argument("--trace", action=argparse.BooleanOptionalAction, default=None, help="为每个文件在译文旁生成 .trace.json 性能追踪")
+    parser.add_argument("--trace-format", choices=("chrome", "jsonl"), help="追踪文件格式：chrome（Perfetto / chrome://tracing）或 jsonl")
+    parser.add_argument("--metrics-port", type=int, help="在该端口提供 Prometheus 指标（/metrics）；多进程时第 N 个进程使用端口 + N - 1")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="同时翻译的文件数（进程数）")
+    return parser
+
+def _output_path_for(input_path, args, root_dirs):
+    if args.output:
+        return args.output
+    output_path = default_output_path(input_path, args.target_language)
+    if not args.output_dir:
+        return output_path
+    relative = os.path.basename(output_path)
+    for root_dir in root_dirs:
+        if os.path.abspath(input_path).startswith(os.path.abspath(root_dir) + os.sep):
+            relative = os.path.relpath(output_path, root_dir)
+            break
+    destination = os.path.join(args.output_dir, relative)
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    return destination
+
+def _print_summary(results, wall_seconds, priced):
+    print("\n文件\t状态\t行数\t耗时(秒)\t行/秒\tTokens\t费用($)")
+    total_lines = 0
+    for r in results:
+        rate = r["lines"] / r["seconds"] if r["seconds"] else 0.0
+        status = r["status"] if not r["failed_windows"] else f"{r['status']}（{r['failed_windows']} 个窗口失败）"
+        tokens = r["prompt_tokens"] + r["completion_tokens"]
+        cost = f"{r['cost']:.4f}" if priced else "-"
+        print(f"{r['input_path']}\t{status}\t{r['lines']}\t{r['seconds']:.1f}\t{rate:.1f}\t{tokens}\t{cost}")
+        if r["error"]:
+            print(f"  错误: {r['error']}")
+        total_lines += r["lines"]
+    completed = sum(1 for r in results if r["status"] == "completed")
+    rate = total_lines / wall_seconds if wall_seconds else 0.0
+    print(f"合计：{completed}/{len(results)} 个文件完成，共 {total_lines} 行，总耗时 {wall_seconds:.1f} 秒，吞吐量 {rate:.1f} 行/秒")
+    usage = merge_usage_reports([r["usage"] for r in results if r["usage"]])
+    total_tokens = usage["total"]["prompt_tokens"] + usage["total"]["completion_tokens"]
+    if total_tokens:
+        cost = f"，约 ${usage['cost']:.4f}" if priced else ""
+        print(f"Token 用量：提示词 {usage['total']['prompt_tokens']}（缓存 {usage['total']['cached_tokens']}），输出 {usage['total']['completion_tokens']}{cost}，每行 {total_tokens / max(total_lines, 1):.1f} tokens")
+
+def main(argv=None):
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument("--config", default=config_manager.CONFIG_FILE)
+    config_manager.CONFIG_FILE = pre_parser.parse_known_args(argv)[0].config
+    args = build_parser(load_config()).parse_args(argv)
+
+    if not args.api_key:
+        print("错误: 未提供 API Key（--api-key、config.json 或环境变量 OPENAI_API_KEY）", file=sys.stderr)
+        return EXIT_USAGE
+    if args.window_size <= 0 or args.temperature < 0 or args.retries < 0 or args.concurrency <= 0 or args.token_budget < 0 or args.jobs <= 0 \
+            or (args.max_tokens or 0) < 0 or (args.max_cost or 0) < 0:
+        print("错误: 窗口大小、温度、重试次数、并发数、Token 预算和进程数必须是有效的正数", file=sys.stderr)
+        return EXIT_USAGE
+    if args.deep_summary and not args.summary_model:
+        print("错误: 启用深度理解时，必须指定摘要模型", file=sys.stderr)
+        return EXIT_USAGE
+
+    inputs = collect_inputs(args.inputs, args.target_language)
+    if not inputs:
+        print("错误: 没有找到 .srt / .ass 字幕文件", file=sys.stderr)
+        return EXIT_USAGE
+    if args.output and len(inputs) > 1:
+        print("错误: 输入多个文件时不能使用 --output，请改用 --output-dir", file=sys.stderr)
+        return EXIT_USAGE
+
+    system_prompt = "" if args.deep_summary else build_system_prompt(args.source_language, args.target_language, args.context)
+    job_args = (
+        args.window_size, args.temperature, args.api_base, args.api_key, args.model, system_prompt,
+        args.retries, args.concurrency, args.async_engine, args.source_language, args.target_language,
+        args.translation_memory, args.dedup, args.adaptive_window, args.token_budget, args.stream,
+        args.resume, args.hedge, args.summary_model if args.deep_summary else "",
+        {k: v for k, v in (("max_tokens", args.max_tokens), ("max_cost", args.max_cost)) if v is not None},
+        {k: v for k, v in (("enabled", args.trace), ("format", args.trace_format)) if v is not None}
+    )
+    root_dirs = [p for p in args.inputs if os.path.isdir(p)]
+    tasks = [(path, _output_path_for(path, args, root_dirs), job_args) for path in inputs]
+
+    results = []
+    interrupted = False
+    start_time = time.time()
+    if args.jobs == 1:
+        _init_worker(config_manager.CONFIG_FILE, args.metrics_port)
+        for task in tasks:
+            results.append(_translate_file(task))
+            if _reporter.stop_requested:
+                interrupted = True
+                break
+    else:
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker,
+                                 initargs=(config_manager.CONFIG_FILE, args.metrics_port, multiprocessing.Value("i", 0))) as executor:
+            futures = [executor.submit(_translate_file, task) for task in tasks]
+            pending = set(futures)
+            while pending:
+                try:
+                    for future in as_completed(pending):
+                        pending.discard(future)
+                        results.append(future.result())
+                except KeyboardInterrupt:
+                    if not interrupted:
+                        interrupted = True
+                        print("正在停止：等待进行中的文件保存部分结果...", file=sys.stderr)
+                        for future in pending:
+                            future.cancel()
+                        pending = {f for f in pending if not f.cancelled()}
+    _print_summary(results, time.time() - start_time, bool(load_config().get("pricing", DEFAULT_CONFIG["pricing"])))
+    if args.usage_json:
+        files = [{"input_path": r["input_path"], "output_path": r["output_path"], "status": r["status"], "lines": r["lines"], **(r["usage"] or {})} for r in results]
+        write_usage_report(args.usage_json, {**merge_usage_reports([r["usage"] for r in results if r["usage"]]), "files": files})
+
+    if interrupted or any(r["status"] == "stopped" for r in results):
+        return EXIT_INTERRUPTED
+    if any(r["status"] == "budget_exceeded" for r in results):
+        return EXIT_BUDGET
+    if any(r["status"] != "completed" for r in results):
+        return EXIT_FAILED
+    if any(r["failed_windows"] for r in results):
+        return EXIT_INCOMPLETE
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
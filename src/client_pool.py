@@ -0,0 +1,122 @@
+# client_pool.py
+import asyncio
+import importlib.util
+import threading
+import weakref
+from typing import Dict, Tuple
+
+import httpx
+import openai
+
+DEFAULT_POOL_SETTINGS = {
+    "max_connections": 64,
+    "max_keepalive_connections": 32,
+    "keepalive_expiry": 60.0,
+    "timeout": 120.0,
+    "connect_timeout": 10.0,
+    "http2": True
+}
+
+_pool_settings = dict(DEFAULT_POOL_SETTINGS)
+_clients: Dict[Tuple[str, str], openai.OpenAI] = {}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_stats = {"requests": 0, "new_connections": 0}
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+_http2_notice_shown = False
+
+def configure_pool(**settings):
+    unknown = set(settings) - set(DEFAULT_POOL_SETTINGS)
+    if unknown:
+        raise ValueError(f"未知的连接池参数: {', '.join(sorted(unknown))}")
+    with _lock:
+        _pool_settings.update(settings)
+
+def _record_trace_event(name):
+    if name == "connection.connect_tcp.started":
+        with _lock:
+            _stats["new_connections"] += 1
+    elif name.endswith(".send_request_headers.started"):
+        with _lock:
+            _stats["requests"] += 1
+
+def _trace(name, info):
+    _record_trace_event(name)
+
+async def _atrace(name, info):
+    _record_trace_event(name)
+
+def _attach_trace(request):
+    request.extensions["trace"] = _trace
+
+async def _attach_atrace(request):
+    request.extensions["trace"] = _atrace
+
+def _httpx_options():
+    global _http2_notice_shown
+    settings = _pool_settings
+    if settings["http2"] and not HTTP2_AVAILABLE and not _http2_notice_shown:
+        print("提示: 未安装 h2 库（pip install httpx[http2]），将使用 HTTP/1.1。")
+        _http2_notice_shown = True
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"]
+        ),
+        "timeout": httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        "http2": settings["http2"] and HTTP2_AVAILABLE
+    }
+
+def get_client(api_base: str, api_key: str) -> openai.OpenAI:
+    key = (api_base, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            options = _httpx_options()
+            http_client = openai.DefaultHttpxClient(event_hooks={"request": [_attach_trace]}, **options)
+            client = openai.OpenAI(base_url=api_base, api_key=api_key, timeout=options["timeout"], max_retries=0, http_client=http_client)
+            _clients[key] = client
+    return client
+
+def get_async_client(api_base: str, api_key: str) -> openai.AsyncOpenAI:
+    loop = asyncio.get_running_loop()
+    key = (api_base, api_key)
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            options = _httpx_options()
+            http_client = openai.DefaultAsyncHttpxClient(event_hooks={"request": [_attach_atrace]}, **options)
+            client = openai.AsyncOpenAI(base_url=api_base, api_key=api_key, timeout=options["timeout"], max_retries=0, http_client=http_client)
+            loop_clients[key] = client
+    return client
+
+async def close_async_clients():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.pop(loop, {})
+    for client in loop_clients.values():
+        await client.close()
+
+def close_all_clients():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+def get_pool_stats() -> Dict[str, int]:
+    with _lock:
+        requests = _stats["requests"]
+        new_connections = _stats["new_connections"]
+    return {
+        "requests": requests,
+        "new_connections": new_connections,
+        "reused_connections": max(requests - new_connections, 0)
+    }
+
+def format_pool_stats() -> str:
+    stats = get_pool_stats()
+    return f"HTTP 请求 {stats['requests']} 次，新建连接 {stats['new_connections']} 次，复用连接 {stats['reused_connections']} 次"
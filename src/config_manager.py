@@ -25,7 +25,78 @@ DEFAULT_CONFIG = {
     "api_base": "https://api.openai.com/v1",
     "api_key": "",
     "translation_model": "gpt-4o-mini",
-    "summary_model": "gpt-4o"
+    "summary_model": "gpt-4o",
+    "concurrency": 4,
+    "async_engine": False,
+    "deduplicate_lines": True,
+    "adaptive_window_enabled": False,
+    "token_budget": 0,
+    "stream_output": False,
+    "hedge_requests": False,
+    "strip_markup": True,
+    "usage_report": False,
+    "budget": {
+        "max_tokens": 0,
+        "max_cost": 0.0
+    },
+    "pricing": {},
+    "metrics": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 9464
+    },
+    "trace": {
+        "enabled": False,
+        "format": "chrome"
+    },
+    "event_filter": {
+        "skip_comments": True,
+        "skip_drawings": True,
+        "skip_karaoke": True,
+        "skip_styles": [],
+        "skip_actor_pattern": ""
+    },
+    "adaptive_window": {
+        "min_size": 5,
+        "max_size": 60
+    },
+    "summary": {
+        "chunk_chars": 12000,
+        "fan_out": 4,
+        "final_length": 200,
+        "timeout": 600
+    },
+    "hedging": {
+        "percentile": 0.9,
+        "min_samples": 10,
+        "min_delay": 2.0,
+        "max_hedge_ratio": 0.1
+    },
+    "http_pool": {
+        "max_connections": 64,
+        "max_keepalive_connections": 32,
+        "keepalive_expiry": 60.0,
+        "timeout": 120.0,
+        "connect_timeout": 10.0,
+        "http2": True
+    },
+    "checkpoint_dir": "checkpoints",
+    "document_cache_mb": 512,
+    "streaming_io": {
+        "min_mb": 64,
+        "chunk_events": 5000
+    },
+    "backends": [],
+    "backend_strategy": "least_outstanding",
+    "backend_eject_after": 3,
+    "backend_eject_seconds": 60.0,
+    "rate_limits": [],
+    "max_rate_limit_retries": 5,
+    "translation_memory": {
+        "enabled": True,
+        "path": "translation_memory.db",
+        "max_entries": 200000
+    }
 }
 
 def get_config_value(key, default=None):
@@ -11,13 +11,13 @@ if sys.platform == "win32":
 from tkinter import filedialog, messagebox, ttk
 import threading
 import os
-import time
-import datetime
 import webbrowser
 
 from config_manager import load_config, save_config, DEFAULT_CONFIG
-from subtitle_parser import load_subtitles, save_subtitles, SubtitleHandlingError
-from translator import translate_batch, TranslationError, SYSTEM_PROMPT_TEMPLATE, SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE
+from client_pool import get_client
+from subtitle_parser import load_subtitles, SubtitleHandlingError
+from subtitle_stream import should_stream, load_subtitles_streaming
+from pipeline import run_translation_job, apply_runtime_config, build_system_prompt, default_output_path
 
 stop_translation_flag = False
 
@@ -92,104 +92,37 @@ def show_warning(title, message):
 def show_error(title, message):
     messagebox.showerror(title, message)
 
-def translation_worker(input_path, output_path, window_size, temperature, api_base, api_key, translation_model, system_prompt, retry_times):
-    global stop_translation_flag
-    start_button.config(state="disabled")
-    stop_button.config(state="normal")
-    update_eta("")
-    root.after(0, update_preview_widgets, ["翻译即将开始..."], [""])
+class GuiReporter:
+    def status(self, text):
+        update_status(text)
 
-    try:
-        update_status("加载字幕文件中...")
-        subs, texts = load_subtitles(input_path)
-        original_num_lines = len(texts)
-        update_status(f"加载完成，共 {original_num_lines} 行")
-
-        translated_texts = []
-        durations = []
-        update_progress(0, original_num_lines)
-        update_eta(f"总行数：{original_num_lines}\n等待至少2个窗口以计算剩余时间...")
-
-        for i in range(0, original_num_lines, window_size):
-            if stop_translation_flag:
-                update_status("用户请求中断...")
-                break
-
-            batch_texts = texts[i : i + window_size]
-            current_batch_info = f"行 {i + 1} - {min(i + len(batch_texts), original_num_lines)}"
-            update_status(f"开始翻译 {current_batch_info}...")
-
-            batch_start_time = time.time()
-
-            batch_translated, warning_msg = translate_batch(
-                texts=batch_texts,
-                api_key=api_key,
-                api_base=api_base,
-                model=translation_model,
-                system_prompt=system_prompt,
-                temperature=temperature,
-                max_retries=retry_times
-            )
+    def eta(self, text):
+        update_eta(text)
 
-            batch_end_time = time.time()
-            durations.append(batch_end_time - batch_start_time)
-            
-            root.after(0, update_preview_widgets, batch_texts, batch_translated)
+    def progress(self, value, maximum):
+        update_progress(value, maximum)
 
-            if warning_msg:
-                 update_status(f"{current_batch_info}: {warning_msg}")
-                 print(f"翻译 {current_batch_info} 时出现警告/错误: {warning_msg}")
-            else:
-                 update_status(f"完成翻译 {current_batch_info}")
+    def preview(self, original_texts, translated_texts):
+        root.after(0, update_preview_widgets, original_texts, translated_texts)
 
-            translated_texts.extend(batch_translated)
-            update_progress(len(translated_texts), original_num_lines)
+    def info(self, title, message):
+        show_info(title, message)
 
-            if len(durations) >= 2:
-                avg_time_per_batch = sum(durations) / len(durations)
-                remaining_batches = (original_num_lines - len(translated_texts) + window_size - 1) // window_size
-                eta_seconds = int(avg_time_per_batch * remaining_batches)
-                eta_str = str(datetime.timedelta(seconds=eta_seconds))
-                update_eta(f"总行数：{original_num_lines}\n预计剩余时间：{eta_str}")
-            else:
-                 update_eta(f"总行数：{original_num_lines}\n正在计算剩余时间...")
-
-        if stop_translation_flag:
-            partial_output_path = output_path.replace(".ass", "_partial.ass").replace(".srt", "_partial.srt")
-            update_status(f"正在保存部分结果至 {partial_output_path}...")
-            try:
-                save_subtitles(subs, partial_output_path, translated_texts, original_num_lines)
-                update_status(f"用户终止，部分翻译已保存至 {partial_output_path}")
-                update_eta(f"总行数：{original_num_lines}\n翻译被中止")
-                show_warning("中止", f"翻译被用户中止。\n已保存部分结果到:\n{partial_output_path}")
-            except SubtitleHandlingError as e:
-                update_status(f"保存部分结果时出错: {e}")
-                show_error("保存错误", f"保存部分结果时出错:\n{e}")
-        else:
-            update_status(f"正在保存完整结果至 {output_path}...")
-            try:
-                save_subtitles(subs, output_path, translated_texts, original_num_lines)
-                update_status("翻译完成！")
-                update_eta("所有翻译已完成。")
-                show_info("完成", f"翻译完成!\n已保存至:\n{output_path}")
-            except SubtitleHandlingError as e:
-                update_status(f"保存结果时出错: {e}")
-                show_error("保存错误", f"保存结果时出错:\n{e}")
-
-    except FileNotFoundError as e:
-        update_status("错误：输入文件未找到")
-        show_error("文件错误", str(e))
-    except SubtitleHandlingError as e:
-        update_status(f"字幕处理错误: {e}")
-        show_error("字幕错误", str(e))
-    except TranslationError as e:
-         update_status(f"翻译错误: {e}")
-         show_error("翻译错误", str(e))
-    except Exception as e:
-        update_status(f"发生意外错误: {e}")
-        show_error("意外错误", f"发生未预料的错误:\n{type(e).__name__}: {e}")
-        import traceback
-        traceback.print_exc()
+    def warning(self, title, message):
+        show_warning(title, message)
+
+    def error(self, title, message):
+        show_error(title, message)
+
+    def should_stop(self):
+        return stop_translation_flag
+
+def translation_worker(*args):
+    global stop_translation_flag
+    start_button.config(state="disabled")
+    stop_button.config(state="normal")
+    try:
+        run_translation_job(*args, reporter=GuiReporter())
     finally:
         stop_translation_flag = False
         start_button.config(state="normal")
@@ -220,7 +153,7 @@ def handle_test_api():
     def test_thread():
         try:
             import openai
-            client = openai.OpenAI(base_url=api_base, api_key=api_key)
+            client = get_client(api_base, api_key)
 
             response = client.chat.completions.create(
                 model=model_to_test,
@@ -256,10 +189,12 @@ def handle_start_translation():
         window_size = int(window_entry.get())
         temperature = float(temp_entry.get())
         retry_times = int(retry_entry.get())
-        if window_size <= 0 or temperature < 0 or retry_times < 0:
+        concurrency = int(concurrency_entry.get())
+        token_budget = int(token_budget_entry.get() or 0)
+        if window_size <= 0 or temperature < 0 or retry_times < 0 or concurrency <= 0 or token_budget < 0:
             raise ValueError("数值必须为正")
     except ValueError as e:
-        show_error("输入错误", f"窗口大小、温度和重试次数必须是有效的正数: {e}")
+        show_error("输入错误", f"窗口大小、温度、重试次数、并发数和 Token 预算必须是有效的正数: {e}")
         return
 
     source_language = source_lang_entry.get().strip()
@@ -290,58 +225,45 @@ def handle_start_translation():
         show_warning("警告", "API Base URL 为空，将使用默认值。")
 
     if not output_path:
-        base, ext = os.path.splitext(input_path)
-        lang_suffix = f"_{target_language.lower().replace(' ', '')}" if target_language != "Simplified Chinese" else "_cn"
-        output_path = f"{base}{lang_suffix}{ext}"
+        output_path = default_output_path(input_path, target_language)
         output_entry.delete(0, tk.END)
         output_entry.insert(0, output_path)
 
-    save_config({
+    saved_config = load_config()
+    saved_config.update({
         "api_base": api_base,
         "api_key": api_key,
         "translation_model": translation_model,
         "summary_model": summary_model,
         "source_language": source_language,
-        "target_language": target_language
+        "target_language": target_language,
+        "concurrency": concurrency,
+        "async_engine": use_async_engine_var.get(),
+        "deduplicate_lines": deduplicate_lines_var.get(),
+        "adaptive_window_enabled": adaptive_window_var.get(),
+        "token_budget": token_budget,
+        "stream_output": stream_output_var.get(),
+        "hedge_requests": hedge_requests_var.get()
     })
+    save_config(saved_config)
 
     final_system_prompt = ""
+    deep_summary_model = ""
     if use_deep_summary_var.get():
         if not summary_model:
             show_error("错误", "启用深度理解时，必须指定摘要模型！")
             return
-        update_status("正在生成内容摘要...")
-        try:
-            from subtitle_parser import load_subtitles
-            from translator import summarize_subtitles
-            _, full_texts = load_subtitles(input_path)
-            summary = summarize_subtitles(
-                texts=full_texts,
-                api_key=api_key,
-                api_base=api_base,
-                model=summary_model,
-                temperature=0.3
-            )
-            final_system_prompt = SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE.format(
-                source_language=source_language,
-                target_language=target_language,
-                summary=summary
-            )
-        except Exception as e:
-            show_error("摘要失败", f"生成摘要失败：{e}")
-            return
+        deep_summary_model = summary_model
     else:
-        context_prefix = f"关于{context_desc}的" if context_desc else ""
-        final_system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
-            context=context_prefix,
-            source_language=source_language,
-            target_language=target_language
-        )
-    print(f"Using System Prompt:\n{final_system_prompt}")
+        final_system_prompt = build_system_prompt(source_language, target_language, context_desc)
+        print(f"Using System Prompt:\n{final_system_prompt}")
 
     thread = threading.Thread(target=translation_worker, args=(
         input_path, output_path, window_size, temperature,
-        api_base, api_key, translation_model, final_system_prompt, retry_times
+        api_base, api_key, translation_model, final_system_prompt, retry_times, concurrency,
+        use_async_engine_var.get(), source_language, target_language, use_translation_memory_var.get(),
+        deduplicate_lines_var.get(), adaptive_window_var.get(), token_budget, stream_output_var.get(),
+        resume_var.get(), hedge_requests_var.get(), deep_summary_model
     ), daemon=True)
     thread.start()
 
@@ -350,11 +272,10 @@ def handle_stop_translation():
     if not stop_translation_flag:
         stop_translation_flag = True
         stop_button.config(state="disabled")
-        update_status("终止请求已发送，等待当前批次完成...")
+        update_status("终止请求已发送，等待进行中的批次完成...")
         update_eta("处理终止请求中...")
 
 def handle_browse_input():
-    global total_subtitle_lines
     file_path = filedialog.askopenfilename(
         title="选择输入字幕文件",
         filetypes=[("字幕文件", "*.ass *.srt"), ("所有文件", "*.*")]
@@ -368,17 +289,32 @@ def handle_browse_input():
             output_entry.delete(0, tk.END)
             output_entry.insert(0, output_path)
         
-        try:
-            update_status(f"正在加载和统计 '{os.path.basename(file_path)}'...")
+        update_status(f"正在加载和统计 '{os.path.basename(file_path)}'...")
+        threading.Thread(target=preload_subtitles, args=(file_path,), daemon=True).start()
+
+def preload_subtitles(file_path):
+    try:
+        streaming_config = {**DEFAULT_CONFIG["streaming_io"], **load_config().get("streaming_io", {})}
+        if should_stream(file_path, file_path, int(streaming_config["min_mb"] * 1024 * 1024)):
+            # 大文件只统计行数，不放入文档缓存
+            _, texts = load_subtitles_streaming(file_path, streaming_config["chunk_events"])
+        else:
             _, texts = load_subtitles(file_path)
-            total_subtitle_lines = len(texts)
-            update_window_suggestion()
-            update_status("文件已加载，请检查翻译选项。")
-        except (SubtitleHandlingError, FileNotFoundError) as e:
-            show_error("文件加载错误", str(e))
-            total_subtitle_lines = 0
-            update_window_suggestion()
-            update_status("加载字幕文件失败。")
+        root.after(0, on_subtitles_preloaded, file_path, len(texts), None)
+    except (SubtitleHandlingError, FileNotFoundError) as e:
+        root.after(0, on_subtitles_preloaded, file_path, 0, e)
+
+def on_subtitles_preloaded(file_path, line_count, error):
+    global total_subtitle_lines
+    if input_entry.get() != file_path:
+        return
+    total_subtitle_lines = line_count
+    update_window_suggestion()
+    if error:
+        show_error("文件加载错误", str(error))
+        update_status("加载字幕文件失败。")
+    else:
+        update_status("文件已加载，请检查翻译选项。")
 
 def update_window_suggestion(*args):
     if total_subtitle_lines == 0:
@@ -507,6 +443,51 @@ target_lang_entry = tk.Entry(options_frame, width=15)
 target_lang_entry.grid(row=2, column=5, columnspan=2, sticky="w", padx=2, pady=5)
 CreateToolTip(target_lang_entry, "输入您希望翻译成的目标语言。\n(例如: 简体中文, 法语, 韩语)")
 
+tk.Label(options_frame, text="并发数:").grid(row=3, column=0, sticky="e", padx=2, pady=5)
+concurrency_entry = tk.Entry(options_frame, width=5)
+concurrency_entry.grid(row=3, column=1, sticky="w", padx=2, pady=5)
+CreateToolTip(concurrency_entry, "同时发送的窗口（批次）数量。\n越大：总耗时越短，但更容易触发服务商的速率限制。\n设为 1 则逐个窗口顺序翻译。")
+
+use_async_engine_var = tk.BooleanVar(value=False)
+async_engine_check = tk.Checkbutton(options_frame, text="使用异步引擎", variable=use_async_engine_var)
+async_engine_check.grid(row=3, column=3, columnspan=2, sticky="w", padx=2, pady=5)
+CreateToolTip(async_engine_check, "使用 asyncio 在单个后台线程中驱动所有并发请求，\n不再为每个请求创建线程，适合较大的并发数。")
+
+use_translation_memory_var = tk.BooleanVar(value=True)
+translation_memory_check = tk.Checkbutton(options_frame, text="使用翻译记忆", variable=use_translation_memory_var)
+translation_memory_check.grid(row=3, column=5, columnspan=2, sticky="w", padx=(15,0), pady=5)
+CreateToolTip(translation_memory_check, "复用此前翻译过的相同句子（相同语言、模型与提示词），\n仅将未命中的行发送给 API。\n取消勾选可在本次翻译中跳过查询，新结果仍会写入记忆库。")
+
+deduplicate_lines_var = tk.BooleanVar(value=True)
+deduplicate_lines_check = tk.Checkbutton(options_frame, text="合并重复行", variable=deduplicate_lines_var)
+deduplicate_lines_check.grid(row=4, column=0, columnspan=2, sticky="w", padx=2, pady=5)
+CreateToolTip(deduplicate_lines_check, "相同的字幕文本（如 \"♪\"、\"What?\"、卡拉OK重复层）只翻译一次，\n结果回填到所有出现位置，可减少请求和 token 消耗。")
+
+adaptive_window_var = tk.BooleanVar(value=False)
+adaptive_window_check = tk.Checkbutton(options_frame, text="自适应窗口", variable=adaptive_window_var)
+adaptive_window_check.grid(row=4, column=3, columnspan=2, sticky="w", padx=2, pady=5)
+CreateToolTip(adaptive_window_check, "以“窗口大小”为起点，根据近期批次的解析成功率、每行耗时\n和输出截断情况自动调整后续窗口的行数。\n上下限可在 config.json 的 adaptive_window 中设置。")
+
+tk.Label(options_frame, text="Token 预算:").grid(row=4, column=5, sticky="e", padx=2, pady=5)
+token_budget_entry = tk.Entry(options_frame, width=6)
+token_budget_entry.grid(row=4, column=6, sticky="w", padx=2, pady=5)
+CreateToolTip(token_budget_entry, "（可选）按估算的 token 数打包窗口，包括系统提示词和 [n] 编号。\n此时“窗口大小”作为每个窗口的行数上限。\n填 0 或留空则仅按行数分窗口。")
+
+stream_output_var = tk.BooleanVar(value=False)
+stream_output_check = tk.Checkbutton(options_frame, text="流式输出", variable=stream_output_var)
+stream_output_check.grid(row=5, column=0, columnspan=2, sticky="w", padx=2, pady=5)
+CreateToolTip(stream_output_check, "以流式方式接收模型输出，每解析出完整的一行就立即更新预览和进度。\n若模型输出明显偏离 [n] 格式，会提前中止该次请求并重试缺失的行。")
+
+resume_var = tk.BooleanVar(value=True)
+resume_check = tk.Checkbutton(options_frame, text="断点续传", variable=resume_var)
+resume_check.grid(row=5, column=3, columnspan=2, sticky="w", padx=2, pady=5)
+CreateToolTip(resume_check, "每完成一个窗口就写入检查点日志（按输入文件内容与翻译设置区分）。\n程序崩溃或中止后，以相同设置重新翻译时跳过已完成的行。\n取消勾选则清除旧的检查点并从头开始。")
+
+hedge_requests_var = tk.BooleanVar(value=False)
+hedge_requests_check = tk.Checkbutton(options_frame, text="请求对冲", variable=hedge_requests_var)
+hedge_requests_check.grid(row=5, column=5, columnspan=2, sticky="w", padx=(15,0), pady=5)
+CreateToolTip(hedge_requests_check, "某个窗口的等待时间超过近期耗时的 90 分位时，\n再发送一份相同请求（有多个后端时优先发往其他后端），采用先返回的有效结果。\n额外请求数量受 config.json 中 hedging.max_hedge_ratio 限制，会增加少量 token 消耗。")
+
 api_frame = tk.LabelFrame(root, text="API 配置", padx=10, pady=10)
 api_frame.grid(row=4, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
 
@@ -591,6 +572,14 @@ model_entry.insert(0, config.get("translation_model", DEFAULT_CONFIG.get("transl
 summary_model_entry.insert(0, config.get("summary_model", DEFAULT_CONFIG.get("summary_model", "gpt-4o")))
 source_lang_entry.insert(0, config.get("source_language", "英语"))
 target_lang_entry.insert(0, config.get("target_language", "简体中文"))
+concurrency_entry.insert(0, str(config.get("concurrency", DEFAULT_CONFIG.get("concurrency", 4))))
+use_async_engine_var.set(config.get("async_engine", DEFAULT_CONFIG.get("async_engine", False)))
+deduplicate_lines_var.set(config.get("deduplicate_lines", DEFAULT_CONFIG.get("deduplicate_lines", True)))
+adaptive_window_var.set(config.get("adaptive_window_enabled", DEFAULT_CONFIG.get("adaptive_window_enabled", False)))
+token_budget_entry.insert(0, str(config.get("token_budget", DEFAULT_CONFIG.get("token_budget", 0))))
+stream_output_var.set(config.get("stream_output", DEFAULT_CONFIG.get("stream_output", False)))
+hedge_requests_var.set(config.get("hedge_requests", DEFAULT_CONFIG.get("hedge_requests", False)))
+apply_runtime_config(config)
 
 toggle_context_state()
 default_font = tkFont.nametofont("TkDefaultFont")
@@ -0,0 +1,85 @@
+# hedging.py
+import math
+import threading
+from collections import deque
+from typing import Optional
+
+class HedgePolicy:
+    def __init__(self, percentile: float = 0.9, min_samples: int = 10, min_delay: float = 2.0, max_hedge_ratio: float = 0.1, history: int = 100):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.windows = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.loser_stats = []
+        self._pending_losers = set()
+        self._samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._losers_done = threading.Condition(self._lock)
+
+    def record(self, duration: float, lines: int):
+        with self._lock:
+            self._samples.append(duration / max(lines, 1))
+
+    def window_started(self):
+        with self._lock:
+            self.windows += 1
+
+    def delay(self, lines: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+            seconds_per_line = ordered[max(0, math.ceil(self.percentile * len(ordered)) - 1)]
+        return max(self.min_delay, seconds_per_line * lines)
+
+    def try_start_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_ratio * self.windows:
+                return False
+            self.hedges += 1
+            return True
+
+    def cancel_hedge(self):
+        with self._lock:
+            self.hedges -= 1
+
+    def hedge_won(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def record_loser(self, stats: dict):
+        with self._lock:
+            self.loser_stats.append(stats)
+
+    # 同步引擎无法中途取消落败请求，记录其 future，结束后再统计用量
+    def track_loser(self, future):
+        with self._lock:
+            self._pending_losers.add(future)
+        future.add_done_callback(self._loser_done)
+
+    # future 的结果先于回调可见，因此以回调中移出待定集合为准，保证等待返回时用量已记录
+    def _loser_done(self, future):
+        stats = None
+        if not future.cancelled() and future.exception() is None:
+            stats = future.result()[2]
+        with self._losers_done:
+            if stats is not None:
+                self.loser_stats.append(stats)
+            self._pending_losers.discard(future)
+            self._losers_done.notify_all()
+
+    def wait_for_losers(self, timeout: Optional[float] = None):
+        with self._losers_done:
+            self._losers_done.wait_for(lambda: not self._pending_losers, timeout)
+
+    def drain_loser_stats(self) -> list:
+        with self._lock:
+            drained, self.loser_stats = self.loser_stats, []
+        return drained
+
+    def describe(self) -> str:
+        with self._lock:
+            return f"请求对冲：共 {self.windows} 个窗口，发送对冲请求 {self.hedges} 次，其中 {self.hedge_wins} 次先于原请求返回"
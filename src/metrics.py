@@ -0,0 +1,159 @@
+# metrics.py
+import bisect
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Optional, Tuple
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple[Tuple[str, str], ...], object] = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.extend(self._render_value(labels, value))
+        return "\n".join(lines)
+
+    def _render_value(self, labels, value):
+        return [f"{self.name}{_format_labels(labels)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_value(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+_registry = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+jobs_total = _register(Counter("ezsubtrans_jobs_total", "已结束的翻译任务数（按状态）"))
+active_jobs = _register(Gauge("ezsubtrans_active_jobs", "正在进行的翻译任务数"))
+windows_total = _register(Counter("ezsubtrans_windows_total", "已完成的窗口数（status=completed/failed）"))
+lines_total = _register(Counter("ezsubtrans_lines_translated_total", "经 API 翻译的行数"))
+lines_per_second = _register(Gauge("ezsubtrans_lines_per_second", "当前任务的翻译吞吐量（行/秒）"))
+window_seconds = _register(Histogram("ezsubtrans_window_duration_seconds", "单个窗口从提交到完成的耗时"))
+request_seconds = _register(Histogram("ezsubtrans_request_duration_seconds", "单次 API 请求耗时（按后端与是否重试）"))
+first_token_seconds = _register(Histogram("ezsubtrans_time_to_first_token_seconds", "流式请求的首 token 耗时"))
+requests_total = _register(Counter("ezsubtrans_requests_total", "API 请求数（按后端与结果）"))
+retries_total = _register(Counter("ezsubtrans_retries_total", "重试/补译请求数"))
+rate_limited_total = _register(Counter("ezsubtrans_rate_limited_total", "收到 429 响应的次数"))
+rate_limit_wait_seconds = _register(Counter("ezsubtrans_rate_limit_wait_seconds_total", "因限流与退避而等待的总秒数"))
+tokens_total = _register(Counter("ezsubtrans_tokens_total", "Token 用量（type=prompt/cached/completion）"))
+memory_lookups_total = _register(Counter("ezsubtrans_translation_memory_lookups_total", "翻译记忆查询的行数（result=hit/miss）"))
+
+def observe_usage(usage: dict, model: str):
+    for key, token_type in (("prompt_tokens", "prompt"), ("cached_tokens", "cached"), ("completion_tokens", "completion")):
+        if usage.get(key):
+            tokens_total.inc(usage[key], type=token_type, model=model)
+
+def observe_attempts(backend: str, stats: dict):
+    for name, start, end, args in stats.get("spans", []):
+        if name in ("request", "retry_request"):
+            retry = "true" if name == "retry_request" else "false"
+            request_seconds.observe(end - start, backend=backend, retry=retry)
+            requests_total.inc(backend=backend, result="error" if "error" in args else "ok")
+            if name == "retry_request":
+                retries_total.inc(backend=backend)
+        elif name == "time_to_first_token":
+            first_token_seconds.observe(end - start, backend=backend)
+        elif name in ("rate_limit_wait", "retry_backoff"):
+            rate_limit_wait_seconds.inc(end - start, backend=backend)
+    if stats.get("rate_limited"):
+        rate_limited_total.inc(stats["rate_limited"], backend=backend)
+    observe_usage(stats, stats.get("model", ""))
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(host: str = "127.0.0.1", port: int = 9464) -> Optional[str]:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return f"http://{_server.server_address[0]}:{_server.server_address[1]}/metrics"
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"警告: 无法在 {host}:{port} 启动指标服务: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        url = f"http://{host}:{port}/metrics"
+        print(f"Prometheus 指标服务已启动：{url}")
+        return url
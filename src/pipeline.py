@@ -0,0 +1,604 @@
+# pipeline.py
+import asyncio
+import datetime
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config_manager import load_config, DEFAULT_CONFIG
+from translation_memory import TranslationMemory
+from preprocess import deduplicate_texts, expand_translations, strip_markup, restore_markup
+from checkpoint import open_journal
+from batching import FixedWindowSizer, AdaptiveWindowSizer, iter_windows, estimate_tokens
+from client_pool import get_async_client, close_async_clients, configure_pool, format_pool_stats
+from rate_limiter import configure_rate_limits, format_rate_limiter_stats, get_rate_limiter
+from backend_pool import build_backend_pool
+from hedging import HedgePolicy
+from usage import UsageLedger, USAGE_KEYS, write_usage_report
+from tracing import Tracer, add_span
+import metrics
+from subtitle_parser import load_subtitles, save_subtitles, select_translatable_events, configure_document_cache, SubtitleHandlingError
+from subtitle_stream import should_stream, load_subtitles_streaming, save_subtitles_streaming
+from translator import translate_batch_pooled, translate_windows_async, estimate_window_usage, summarize_subtitles_async, TranslationError, SYSTEM_PROMPT_TEMPLATE, SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE
+
+EVENT_KIND_LABELS = {"comment": "注释", "drawing": "绘图", "karaoke": "卡拉OK", "style": "指定样式/角色", "empty": "空行"}
+
+class ConsoleReporter:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.stop_requested = False
+        self._last_percent = -1
+
+    def status(self, text):
+        print(f"{self.prefix}{text}")
+
+    def eta(self, text):
+        pass
+
+    def progress(self, value, maximum):
+        percent = int(value * 100 / maximum) if maximum else 0
+        if percent // 10 != self._last_percent // 10:
+            self._last_percent = percent
+            print(f"{self.prefix}进度 {value}/{maximum}（{percent}%）")
+
+    def preview(self, original_texts, translated_texts):
+        pass
+
+    def info(self, title, message):
+        print(f"{self.prefix}{title}: {message}")
+
+    def warning(self, title, message):
+        print(f"{self.prefix}{title}: {message}")
+
+    def error(self, title, message):
+        print(f"{self.prefix}{title}: {message}")
+
+    def should_stop(self):
+        return self.stop_requested
+
+def apply_runtime_config(config: dict):
+    configure_pool(**{**DEFAULT_CONFIG["http_pool"], **config.get("http_pool", {})})
+    configure_document_cache(config.get("document_cache_mb", DEFAULT_CONFIG["document_cache_mb"]))
+    configure_rate_limits(config.get("rate_limits", DEFAULT_CONFIG["rate_limits"]), config.get("max_rate_limit_retries", DEFAULT_CONFIG["max_rate_limit_retries"]))
+    metrics_config = {**DEFAULT_CONFIG["metrics"], **config.get("metrics", {})}
+    if metrics_config["enabled"]:
+        metrics.start_metrics_server(metrics_config["host"], metrics_config["port"])
+
+def build_system_prompt(source_language: str, target_language: str, context_desc: str = "") -> str:
+    context_prefix = f"关于{context_desc}的" if context_desc else ""
+    return SYSTEM_PROMPT_TEMPLATE.format(
+        context=context_prefix,
+        source_language=source_language,
+        target_language=target_language
+    )
+
+def default_output_path(input_path: str, target_language: str) -> str:
+    base, ext = os.path.splitext(input_path)
+    lang_suffix = f"_{target_language.lower().replace(' ', '')}" if target_language != "Simplified Chinese" else "_cn"
+    return f"{base}{lang_suffix}{ext}"
+
+def run_summary_stage(texts, api_base, api_key, model, summary_config, reporter, usage_stats=None):
+    def on_progress(done, total):
+        reporter.status(f"正在生成内容摘要...（{done}/{total}）")
+        reporter.progress(done, total)
+
+    async def summarize():
+        task = asyncio.ensure_future(summarize_subtitles_async(
+            texts=texts,
+            client=get_async_client(api_base, api_key),
+            model=model,
+            temperature=0.3,
+            rate_limiter=get_rate_limiter(api_base, model, api_key),
+            chunk_chars=summary_config["chunk_chars"],
+            fan_out=summary_config["fan_out"],
+            final_length=summary_config["final_length"],
+            on_progress=on_progress,
+            stats=usage_stats
+        ))
+        deadline = time.monotonic() + summary_config["timeout"]
+        try:
+            while not task.done():
+                if reporter.should_stop():
+                    return None
+                if time.monotonic() > deadline:
+                    raise TranslationError(f"生成摘要超时（超过 {summary_config['timeout']} 秒）")
+                await asyncio.wait([task], timeout=0.2)
+            return task.result()
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await close_async_clients()
+
+    return asyncio.run(summarize())
+
+def run_translation_job(input_path, output_path, window_size, temperature, api_base, api_key, translation_model, system_prompt, retry_times, concurrency, use_async_engine=False, source_language="", target_language="", use_translation_memory=True, deduplicate_lines=True, adaptive_window=False, token_budget=0, stream_output=False, resume=True, hedge_requests=False, deep_summary_model="", budget=None, trace=None, reporter=None):
+    reporter = reporter or ConsoleReporter()
+    result = {
+        "input_path": input_path,
+        "output_path": output_path,
+        "status": "failed",
+        "lines": 0,
+        "api_lines": 0,
+        "failed_windows": 0,
+        "summary_seconds": 0.0,
+        "translation_seconds": 0.0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "completion_tokens": 0,
+        "cost": 0.0,
+        "usage": None,
+        "window_seconds": [],
+        "error": None
+    }
+    reporter.eta("")
+    reporter.preview(["翻译即将开始..."], [""])
+    memory = None
+    journal = None
+    ledger = None
+    tracer = Tracer()
+    job_start_time = time.time()
+    metrics.active_jobs.inc()
+
+    try:
+        job_config = load_config()
+        streaming_config = {**DEFAULT_CONFIG["streaming_io"], **job_config.get("streaming_io", {})}
+        event_filter = {**DEFAULT_CONFIG["event_filter"], **job_config.get("event_filter", {})}
+        save_document = save_subtitles
+        if should_stream(input_path, output_path, int(streaming_config["min_mb"] * 1024 * 1024)):
+            reporter.status("文件较大，使用流式读取中...")
+            # 流式读取时一并筛选事件，texts 只包含需要翻译的行
+            subs, texts = load_subtitles_streaming(input_path, streaming_config["chunk_events"], event_filter)
+            line_indices, skipped_events, skipped_tokens = subs.line_indices, subs.skipped_events, subs.skipped_tokens
+            save_document = save_subtitles_streaming
+        else:
+            reporter.status("加载字幕文件中...")
+            subs, texts = load_subtitles(input_path)
+            line_indices, skipped_events = select_translatable_events(subs, **event_filter)
+            skipped_tokens = sum(estimate_tokens(texts[i]) for indices in skipped_events.values() for i in indices)
+            if skipped_events:
+                texts = [texts[i] for i in line_indices]
+        reporter.status(f"加载完成，共 {len(subs)} 行")
+
+        trace_config = {**DEFAULT_CONFIG["trace"], **job_config.get("trace", {}), **(trace or {})}
+        tracer = Tracer(trace_config["enabled"], os.path.basename(input_path))
+        tracer.add("load", job_start_time, time.time(), events=len(subs))
+        preprocess_start_time = time.time()
+        budget_config = {**DEFAULT_CONFIG["budget"], **job_config.get("budget", {}), **(budget or {})}
+        ledger = UsageLedger(job_config.get("pricing", DEFAULT_CONFIG["pricing"]), budget_config["max_tokens"], budget_config["max_cost"])
+
+        budget_reached = False
+
+        def should_stop():
+            return reporter.should_stop() or budget_reached or ledger.exceeded()
+
+        def stop_reason():
+            return "用户请求中断" if reporter.should_stop() else f"已达到预算上限（{ledger.short_summary()}）"
+        if skipped_events:
+            breakdown = "，".join(f"{EVENT_KIND_LABELS[kind]} {len(indices)}" for kind, indices in skipped_events.items())
+            reporter.status(f"跳过 {len(subs) - len(line_indices)} 行无需翻译的事件（{breakdown}），约节省 {skipped_tokens} tokens")
+        original_num_lines = len(texts)
+        result["lines"] = original_num_lines
+
+        markups = None
+        # 摘要阶段使用替换占位符之前的原文
+        summary_texts = texts
+        use_strip_markup = job_config.get("strip_markup", DEFAULT_CONFIG["strip_markup"])
+        if use_strip_markup:
+            stripped = [strip_markup(text) for text in texts]
+            if any(markup for _, markup in stripped):
+                raw_tokens = sum(estimate_tokens(text) for text in texts)
+                texts = [plain for plain, _ in stripped]
+                markups = [markup for _, markup in stripped]
+                saved_tokens = raw_tokens - sum(estimate_tokens(text) for text in texts)
+                reporter.status(f"已将 {sum(1 for m in markups if m)} 行的样式标签替换为占位符，约节省 {saved_tokens} tokens")
+        tracer.add("preprocess", preprocess_start_time, time.time(), lines=original_num_lines, skipped=len(subs) - original_num_lines)
+        backend_pool = build_backend_pool(
+            job_config.get("backends", DEFAULT_CONFIG["backends"]),
+            api_base, api_key, translation_model, concurrency,
+            job_config.get("backend_strategy", DEFAULT_CONFIG["backend_strategy"]),
+            job_config.get("backend_eject_after", DEFAULT_CONFIG["backend_eject_after"]),
+            job_config.get("backend_eject_seconds", DEFAULT_CONFIG["backend_eject_seconds"])
+        )
+        multiple_backends = len(backend_pool.backends) > 1
+        if multiple_backends:
+            concurrency = backend_pool.total_concurrency
+            reporter.status(f"使用 {len(backend_pool.backends)} 个后端，总并发 {concurrency}")
+        job_model = backend_pool.model_label
+        hedge_policy = None
+        if hedge_requests:
+            hedge_policy = HedgePolicy(**{**DEFAULT_CONFIG["hedging"], **job_config.get("hedging", {})})
+
+        journal = open_journal(input_path, {
+            "model": job_model,
+            "system_prompt": f"deep_summary:{deep_summary_model}" if deep_summary_model else system_prompt,
+            "source_language": source_language,
+            "target_language": target_language,
+            "temperature": temperature,
+            "strip_markup": use_strip_markup,
+            "event_filter": event_filter
+        }, job_config.get("checkpoint_dir", DEFAULT_CONFIG["checkpoint_dir"]), resume)
+        journaled = journal.load() if resume else {}
+
+        summary_seconds = 0.0
+        # 翻译记忆按提示词中固定的部分区分；深度摘要的提示词含每次生成的摘要，改用模板本身
+        memory_prompt = system_prompt
+        if deep_summary_model:
+            summary = journal.summary
+            if summary:
+                reporter.status("已从断点恢复内容摘要")
+            else:
+                reporter.status("正在生成内容摘要...")
+                summary_start_time = time.time()
+                summary_usage = {}
+                try:
+                    summary = run_summary_stage(summary_texts, api_base, api_key, deep_summary_model,
+                                                {**DEFAULT_CONFIG["summary"], **job_config.get("summary", {})}, reporter, summary_usage)
+                except Exception as e:
+                    result["error"] = f"生成摘要失败：{e}"
+                    reporter.status(f"生成摘要失败: {e}")
+                    reporter.error("摘要失败", result["error"])
+                    return result
+                finally:
+                    ledger.record("summary", summary_usage, deep_summary_model)
+                    metrics.observe_usage(summary_usage, deep_summary_model)
+                    tracer.add("summary", summary_start_time, time.time(), model=deep_summary_model, **summary_usage)
+                summary_seconds = time.time() - summary_start_time
+                result["summary_seconds"] = summary_seconds
+                if summary is None:
+                    result["status"] = "stopped"
+                    reporter.status("用户终止，已取消摘要生成")
+                    reporter.eta("翻译被中止")
+                    return result
+                journal.append_summary(summary)
+            memory_prompt = SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE
+            system_prompt = SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE.format(
+                source_language=source_language,
+                target_language=target_language,
+                summary=summary
+            )
+            print(f"Using System Prompt:\n{system_prompt}")
+        translation_start_time = time.time()
+
+        if deduplicate_lines:
+            canonical_indices, occurrence = deduplicate_texts(texts)
+        else:
+            canonical_indices, occurrence = list(range(original_num_lines)), list(range(original_num_lines))
+        unique_texts = [texts[i] for i in canonical_indices]
+        occurrence_counts = Counter(occurrence)
+        if len(unique_texts) < original_num_lines:
+            reporter.status(f"合并重复行后需翻译 {len(unique_texts)} 行（原 {original_num_lines} 行）")
+
+        unique_translations = [None] * len(unique_texts)
+        durations = []
+        done_lines = 0
+
+        memory_config = {**DEFAULT_CONFIG["translation_memory"], **job_config.get("translation_memory", {})}
+        memory_key_args = (source_language, target_language, job_model, memory_prompt)
+        if memory_config["enabled"]:
+            memory = TranslationMemory(memory_config["path"], memory_config["max_entries"])
+            if use_translation_memory:
+                reporter.status("正在查询翻译记忆...")
+                memory_hits = memory.lookup_many(unique_texts, *memory_key_args)
+                for index, translation in memory_hits.items():
+                    unique_translations[index] = translation
+                    done_lines += occurrence_counts[index]
+                metrics.memory_lookups_total.inc(len(memory_hits), result="hit")
+                metrics.memory_lookups_total.inc(len(unique_texts) - len(memory_hits), result="miss")
+                reporter.status(f"翻译记忆命中 {done_lines} 行，剩余 {original_num_lines - done_lines} 行待翻译")
+
+        if journaled:
+            resumed_lines = 0
+            for j, line_index in enumerate(canonical_indices):
+                if unique_translations[j] is None and line_index in journaled:
+                    unique_translations[j] = journaled[line_index]
+                    done_lines += occurrence_counts[j]
+                    resumed_lines += occurrence_counts[j]
+            if resumed_lines:
+                reporter.status(f"已从断点恢复 {resumed_lines} 行，剩余 {original_num_lines - done_lines} 行待翻译")
+
+        pending_indices = [i for i, t in enumerate(unique_translations) if t is None]
+        tracer.add("lookup", translation_start_time, time.time(), unique_lines=len(unique_texts), pending_lines=len(pending_indices))
+        dispatch_start_time = time.time()
+        if adaptive_window:
+            adaptive_config = {**DEFAULT_CONFIG["adaptive_window"], **job_config.get("adaptive_window", {})}
+            window_sizer = AdaptiveWindowSizer(window_size, adaptive_config["min_size"], adaptive_config["max_size"])
+        else:
+            window_sizer = FixedWindowSizer(window_size)
+
+        windows = []
+
+        prompt_tokens = estimate_tokens(system_prompt) if token_budget else 0
+        if token_budget and prompt_tokens >= token_budget:
+            print(f"警告: 系统提示词约 {prompt_tokens} tokens，已超过 Token 预算 {token_budget}，每个窗口将只包含 1 行。")
+
+        window_reservations = []
+
+        def generate_windows():
+            nonlocal budget_reached
+            for window in iter_windows(pending_indices, window_sizer, unique_texts, token_budget, prompt_tokens):
+                batch_texts = [unique_texts[j] for j in window]
+                # 派发前按估算用量预留预算，进行中的窗口加上新窗口会超出上限时停止派发
+                reservation = ledger.try_reserve(estimate_window_usage(batch_texts, system_prompt), translation_model)
+                if reservation is None:
+                    budget_reached = True
+                    return
+                windows.append(window)
+                window_reservations.append(reservation)
+                yield batch_texts
+
+        window_source = generate_windows()
+        translated_unique_lines = 0
+        streamed_lines = {}
+        # 对冲中落败的流式请求在窗口完成后仍可能回调 on_line，已完成的窗口不再计入进度
+        completed_windows = set()
+        first_line_latencies = []
+        progress_lock = threading.Lock()
+
+        def on_line(window_index, line_index, content):
+            nonlocal done_lines
+            window = windows[window_index]
+            with progress_lock:
+                if window_index in completed_windows:
+                    return
+                streamed = streamed_lines.setdefault(window_index, {})
+                if line_index in streamed:
+                    return
+                streamed[line_index] = content
+                done_lines += occurrence_counts[window[line_index]]
+                preview = [streamed.get(k, "") for k in range(len(window))]
+                progress = done_lines
+            reporter.preview([unique_texts[j] for j in window], preview)
+            reporter.progress(progress, original_num_lines)
+
+        reporter.progress(done_lines, original_num_lines)
+        reporter.eta(f"总行数：{original_num_lines}\n等待至少2个窗口以计算剩余时间...")
+
+        def record_hedge_losers():
+            for loser_stats in hedge_policy.drain_loser_stats():
+                ledger.record("hedge", {key: loser_stats.get(key, 0) for key in USAGE_KEYS}, loser_stats.get("model", ""))
+
+        def on_window_done(window_index, batch_translated, warning_msg, duration, stats):
+            nonlocal done_lines, translated_unique_lines
+            window = windows[window_index]
+            batch_texts = [unique_texts[j] for j in window]
+            durations.append(duration)
+            window_sizer.record(len(window), duration, stats, warning_msg)
+
+            current_batch_info = f"行 {canonical_indices[window[0]] + 1} - {canonical_indices[window[-1]] + 1}"
+            if adaptive_window:
+                current_batch_info += f"（窗口 {len(window)} 行，下一窗口 {window_sizer.size} 行）"
+            elif token_budget:
+                current_batch_info += f"（窗口 {len(window)} 行）"
+            if "time_to_first_line" in stats:
+                first_line_latencies.append(stats["time_to_first_line"])
+                current_batch_info += f"（首行 {stats['time_to_first_line']:.1f} 秒）"
+            if multiple_backends and "backend" in stats:
+                current_batch_info += f"（{stats['backend']}）"
+            if stats.get("hedge_won"):
+                current_batch_info += "（对冲请求先返回）"
+            ledger.record_window(window_index, len(window), stats)
+            ledger.release(window_reservations[window_index])
+            if hedge_policy:
+                record_hedge_losers()
+            window_end_time = time.time()
+            metrics.windows_total.inc(status="failed" if warning_msg else "completed")
+            metrics.window_seconds.observe(duration)
+            tracer.add_window(window_index, window_end_time - duration, window_end_time, stats,
+                              lines=len(window), backend=stats.get("backend", ""), attempts=stats.get("attempts", 0), failed=bool(warning_msg))
+            if stats.get("prompt_tokens"):
+                print(f"窗口 {window_index + 1} 提示词 {stats['prompt_tokens']} tokens，命中缓存 {stats.get('cached_tokens', 0)} tokens")
+
+            reporter.preview(batch_texts, batch_translated)
+
+            if warning_msg:
+                result["failed_windows"] += 1
+                reporter.status(f"{current_batch_info}: {warning_msg}")
+                print(f"翻译 {current_batch_info} 时出现警告/错误: {warning_msg}")
+            else:
+                journal.append({canonical_indices[j]: t for j, t in zip(window, batch_translated)})
+                if memory:
+                    memory.store_many(list(zip(batch_texts, batch_translated)), *memory_key_args)
+                reporter.status(f"完成翻译 {current_batch_info}")
+
+            with progress_lock:
+                completed_windows.add(window_index)
+                streamed = streamed_lines.pop(window_index, {})
+                for k, (j, translation) in enumerate(zip(window, batch_translated)):
+                    unique_translations[j] = translation
+                    if k not in streamed:
+                        done_lines += occurrence_counts[j]
+                translated_unique_lines += len(window)
+                progress = done_lines
+            metrics.lines_total.inc(len(window))
+            metrics.lines_per_second.set(translated_unique_lines / max(window_end_time - dispatch_start_time, 1e-6))
+
+            reporter.progress(progress, original_num_lines)
+
+            if len(durations) >= 2:
+                seconds_per_line = sum(durations) / translated_unique_lines
+                remaining_lines = len(pending_indices) - translated_unique_lines
+                eta_seconds = int(seconds_per_line * remaining_lines / concurrency)
+                eta_str = str(datetime.timedelta(seconds=eta_seconds))
+                reporter.eta(f"总行数：{original_num_lines}\n预计剩余时间：{eta_str}\n{ledger.short_summary()}")
+            else:
+                reporter.eta(f"总行数：{original_num_lines}\n正在计算剩余时间...\n{ledger.short_summary()}")
+
+        if use_async_engine:
+            async def run_async_engine():
+                try:
+                    await translate_windows_async(
+                        windows=window_source,
+                        api_key=api_key,
+                        api_base=api_base,
+                        model=translation_model,
+                        system_prompt=system_prompt,
+                        temperature=temperature,
+                        max_retries=retry_times,
+                        concurrency=concurrency,
+                        on_window_done=on_window_done,
+                        should_stop=should_stop,
+                        stream=stream_output,
+                        on_line=on_line,
+                        backend_pool=backend_pool,
+                        hedge_policy=hedge_policy,
+                        can_spend=ledger.can_spend
+                    )
+                finally:
+                    await close_async_clients()
+
+            asyncio.run(run_async_engine())
+            if should_stop():
+                reporter.status(f"{stop_reason()}...")
+        else:
+            def translate_window(batch_texts, window_index, submitted_at):
+                stats = {}
+                batch_start_time = time.time()
+                batch_translated, warning_msg = translate_batch_pooled(
+                    texts=batch_texts,
+                    backend_pool=backend_pool,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_retries=retry_times,
+                    stats=stats,
+                    stream=stream_output,
+                    on_line=lambda line_index, content: on_line(window_index, line_index, content),
+                    hedge_policy=hedge_policy,
+                    can_spend=ledger.can_spend
+                )
+                add_span(stats, "queue", submitted_at, batch_start_time)
+                return batch_translated, warning_msg, time.time() - batch_start_time, stats
+
+            in_flight = {}
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                while True:
+                    if should_stop() and in_flight:
+                        reporter.status(f"{stop_reason()}，等待 {len(in_flight)} 个进行中的批次完成...")
+
+                    while not should_stop() and len(in_flight) < concurrency:
+                        batch_texts = next(window_source, None)
+                        if batch_texts is None:
+                            break
+                        window_index = len(windows) - 1
+                        future = executor.submit(translate_window, batch_texts, window_index, time.time())
+                        in_flight[future] = window_index
+
+                    if not in_flight:
+                        if should_stop():
+                            reporter.status(f"{stop_reason()}...")
+                        break
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        on_window_done(in_flight.pop(future), *future.result())
+
+        tracer.add("translate", dispatch_start_time, time.time(), windows=len(windows))
+        translation_seconds = time.time() - translation_start_time
+        result["translation_seconds"] = translation_seconds
+        result["api_lines"] = translated_unique_lines
+        result["window_seconds"] = list(durations)
+        stage_timing = f"摘要阶段耗时 {summary_seconds:.1f} 秒，" if summary_seconds else ""
+        stage_timing += f"翻译阶段耗时 {translation_seconds:.1f} 秒"
+        print(stage_timing)
+        print(window_sizer.describe())
+        if multiple_backends:
+            print(backend_pool.describe())
+        if hedge_policy:
+            print(hedge_policy.describe())
+            # 等待仍在运行的落败请求结束，确保其用量计入账本
+            hedge_policy.wait_for_losers()
+            record_hedge_losers()
+        usage_total = ledger.total()
+        if usage_total["prompt_tokens"]:
+            cache_rate = usage_total["cached_tokens"] / usage_total["prompt_tokens"]
+            print(f"提示词缓存：共 {usage_total['prompt_tokens']} 提示词 tokens，命中缓存 {usage_total['cached_tokens']} tokens（{cache_rate:.0%}）")
+        print(ledger.describe())
+        if first_line_latencies:
+            print(f"流式输出：平均首行耗时 {sum(first_line_latencies) / len(first_line_latencies):.2f} 秒，最长 {max(first_line_latencies):.2f} 秒")
+        postprocess_start_time = time.time()
+        unique_translations = [t if t is not None else "⚠️[翻译缺失]" for t in unique_translations]
+        translated_texts = expand_translations(unique_translations, occurrence)
+        if markups:
+            translated_texts = [restore_markup(text, markup) for text, markup in zip(translated_texts, markups)]
+        tracer.add("postprocess", postprocess_start_time, time.time())
+        if memory:
+            print(memory.format_stats())
+        print(format_pool_stats())
+        print(format_rate_limiter_stats())
+
+        if should_stop():
+            partial_output_path = output_path.replace(".ass", "_partial.ass").replace(".srt", "_partial.srt")
+            reporter.status(f"正在保存部分结果至 {partial_output_path}...")
+            try:
+                with tracer.span("save", partial=True):
+                    save_document(subs, partial_output_path, translated_texts, original_num_lines, line_indices)
+                reason = stop_reason()
+                result.update({"status": "stopped" if reporter.should_stop() else "budget_exceeded", "output_path": partial_output_path})
+                reporter.status(f"{reason}，部分翻译已保存至 {partial_output_path}")
+                reporter.eta(f"总行数：{original_num_lines}\n翻译被中止\n{ledger.short_summary()}")
+                reporter.warning("中止", f"{reason}，翻译已中止。\n已保存部分结果到:\n{partial_output_path}\n\n以相同设置再次翻译该文件时将从断点继续。")
+            except SubtitleHandlingError as e:
+                result["error"] = str(e)
+                reporter.status(f"保存部分结果时出错: {e}")
+                reporter.error("保存错误", f"保存部分结果时出错:\n{e}")
+        else:
+            reporter.status(f"正在保存完整结果至 {output_path}...")
+            try:
+                with tracer.span("save", partial=False):
+                    save_document(subs, output_path, translated_texts, original_num_lines, line_indices)
+                journal.discard()
+                result["status"] = "completed"
+                reporter.status("翻译完成！")
+                reporter.eta(f"所有翻译已完成。\n{ledger.short_summary()}")
+                reporter.info("完成", f"翻译完成!\n已保存至:\n{output_path}\n\n{stage_timing}\n{ledger.describe()}")
+            except SubtitleHandlingError as e:
+                result["error"] = str(e)
+                reporter.status(f"保存结果时出错: {e}")
+                reporter.error("保存错误", f"保存结果时出错:\n{e}")
+
+    except FileNotFoundError as e:
+        result["error"] = str(e)
+        reporter.status("错误：输入文件未找到")
+        reporter.error("文件错误", str(e))
+    except SubtitleHandlingError as e:
+        result["error"] = str(e)
+        reporter.status(f"字幕处理错误: {e}")
+        reporter.error("字幕错误", str(e))
+    except TranslationError as e:
+         result["error"] = str(e)
+         reporter.status(f"翻译错误: {e}")
+         reporter.error("翻译错误", str(e))
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        reporter.status(f"发生意外错误: {e}")
+        reporter.error("意外错误", f"发生未预料的错误:\n{type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        metrics.active_jobs.inc(-1)
+        metrics.jobs_total.inc(status=result["status"])
+        if memory:
+            memory.close()
+        if journal:
+            journal.close()
+        if ledger:
+            result.update(ledger.total())
+            result["cost"] = ledger.cost
+            result["usage"] = ledger.to_dict()
+            if job_config.get("usage_report", DEFAULT_CONFIG["usage_report"]) and result["status"] != "failed":
+                report_path = os.path.splitext(result["output_path"])[0] + ".usage.json"
+                try:
+                    write_usage_report(report_path, {"input_path": input_path, "output_path": result["output_path"], **result["usage"]})
+                except OSError as e:
+                    print(f"警告: 无法写入用量报告 {report_path}: {e}")
+        if tracer.enabled:
+            tracer.add("job", job_start_time, time.time(), status=result["status"])
+            trace_path = os.path.splitext(result["output_path"])[0] + (".trace.jsonl" if trace_config["format"] == "jsonl" else ".trace.json")
+            try:
+                tracer.save(trace_path)
+                print(f"性能追踪已保存至 {trace_path}（可用 https://ui.perfetto.dev 或 chrome://tracing 打开）")
+            except OSError as e:
+                print(f"警告: 无法写入性能追踪 {trace_path}: {e}")
+    return result
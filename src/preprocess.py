@@ -0,0 +1,144 @@
+# preprocess.py
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+def deduplicate_texts(texts: List[str]) -> Tuple[List[int], List[int]]:
+    canonical_indices = []
+    occurrence = []
+    seen: Dict[str, int] = {}
+    for i, text in enumerate(texts):
+        key = normalize_text(text)
+        if key not in seen:
+            seen[key] = len(canonical_indices)
+            canonical_indices.append(i)
+        occurrence.append(seen[key])
+    return canonical_indices, occurrence
+
+def expand_translations(unique_translations: List[str], occurrence: List[int]) -> List[str]:
+    return [unique_translations[u] for u in occurrence]
+
+_OVERRIDE_BLOCK_PATTERN = re.compile(r"\{[^}]*\}")
+_LINE_TAG_PATTERN = re.compile(r"\\(?:pos\([^)]*\)|move\([^)]*\)|org\([^)]*\)|fade?\([^)]*\)|i?clip\([^)]*\)|an\d|a\d+|q\d)")
+_LINE_BREAK_PATTERN = re.compile(r"\s*(\\[Nn])\s*")
+_LEADING_BREAKS_PATTERN = re.compile(r"^\s*(?:\\[Nn]\s*)+")
+_TRAILING_BREAKS_PATTERN = re.compile(r"(?:\s*\\[Nn])+\s*$")
+_PLACEHOLDER_PATTERN = re.compile(r"[{｛]\s*(\d+)\s*[}｝]")
+_BREAK_AFTER = set(" ,.!?;:，。！？；：、…)」』】")
+_DIALOGUE_DASHES = ("-", "–", "—")
+
+class Markup:
+    def __init__(self, prefix: str = "", suffix: str = ""):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.tags: List[Tuple[float, str]] = []
+        self.breaks: List[Tuple[float, bool, str]] = []
+
+def strip_markup(text: str) -> Tuple[str, Optional[Markup]]:
+    if "{" not in text and "\\" not in text:
+        return text, None
+
+    pieces = _OVERRIDE_BLOCK_PATTERN.split(text)
+    blocks = _OVERRIDE_BLOCK_PATTERN.findall(text)
+    has_content = [bool(_LINE_BREAK_PATTERN.sub("", p).strip()) for p in pieces]
+    first = next((i for i, content in enumerate(has_content) if content), None)
+    if first is None:
+        return text, None
+    last = max(i for i, content in enumerate(has_content) if content)
+
+    # 行首、行尾的换行不参与翻译，随前缀、后缀原样保留
+    pieces = list(pieces)
+    leading = _LEADING_BREAKS_PATTERN.match(pieces[first])
+    if leading:
+        pieces[first] = pieces[first][leading.end():]
+    trailing = _TRAILING_BREAKS_PATTERN.search(pieces[last])
+    if trailing:
+        pieces[last] = pieces[last][:trailing.start()]
+    prefix = "".join(piece + block for piece, block in zip(pieces[:first], blocks[:first]))
+    suffix = "".join(block + piece for block, piece in zip(blocks[last:], pieces[last + 1:]))
+    markup = Markup(
+        prefix=prefix + (leading.group().strip() if leading else ""),
+        suffix=(trailing.group().strip() if trailing else "") + suffix
+    )
+    plain = ""
+    tag_positions, break_positions = [], []
+    for i in range(first, last + 1):
+        if i > first:
+            block = blocks[i - 1]
+            line_tags = _LINE_TAG_PATTERN.findall(block)
+            if line_tags:
+                markup.prefix += "{" + "".join(line_tags) + "}"
+                block = _LINE_TAG_PATTERN.sub("", block)
+            if block != "{}":
+                tag_positions.append(len(plain))
+                markup.tags.append((0.0, block))
+                plain += "{" + str(len(markup.tags)) + "}"
+        segments = _LINE_BREAK_PATTERN.split(pieces[i].strip() if first == last else pieces[i])
+        plain += segments[0]
+        for line_break, segment in zip(segments[1::2], segments[2::2]):
+            break_positions.append((len(plain), segment.lstrip().startswith(_DIALOGUE_DASHES), line_break))
+            plain += " " + segment
+
+    visible_length = max(len(_PLACEHOLDER_PATTERN.sub("", plain)), 1)
+    def visible_ratio(position):
+        return len(_PLACEHOLDER_PATTERN.sub("", plain[:position])) / visible_length
+    markup.tags = [(visible_ratio(p), tag) for p, (_, tag) in zip(tag_positions, markup.tags)]
+    markup.breaks = [(visible_ratio(p), dialogue, line_break) for p, dialogue, line_break in break_positions]
+    if not markup.prefix and not markup.suffix and not markup.tags and not markup.breaks:
+        return text, None
+    return plain.strip(), markup
+
+def _break_position(visible: str, ratio: float, dialogue: bool) -> int:
+    target = ratio * len(visible)
+    candidates = [i for i in range(1, len(visible)) if visible[i - 1] in _BREAK_AFTER]
+    if dialogue:
+        dashes = [i for i in candidates if visible[i:].lstrip().startswith(_DIALOGUE_DASHES)]
+        candidates = dashes or candidates
+    if not candidates:
+        return round(target)
+    return min(candidates, key=lambda i: abs(i - target))
+
+def restore_markup(translation: str, markup: Optional[Markup]) -> str:
+    if markup is None:
+        return translation
+
+    anchors = []
+    used = set()
+    visible = ""
+    position = 0
+    for match in _PLACEHOLDER_PATTERN.finditer(translation):
+        visible += translation[position:match.start()]
+        position = match.end()
+        index = int(match.group(1)) - 1
+        if 0 <= index < len(markup.tags) and index not in used:
+            used.add(index)
+            anchors.append((len(visible), markup.tags[index][1]))
+    visible += translation[position:]
+
+    for index, (ratio, tag) in enumerate(markup.tags):
+        if index not in used:
+            anchors.append((round(ratio * len(visible)), tag))
+    if "\\N" not in visible and "\\n" not in visible:
+        for ratio, dialogue, line_break in markup.breaks:
+            anchors.append((_break_position(visible, ratio, dialogue), line_break))
+    # 同一位置上换行先于样式标签插入，标签随后一行的文字
+    anchors.sort(key=lambda anchor: (anchor[0], anchor[1] not in ("\\N", "\\n")))
+
+    restored = ""
+    position = 0
+    for index, insert in anchors:
+        segment = visible[position:index]
+        if insert in ("\\N", "\\n"):
+            restored = (restored + segment).rstrip() + insert
+            position = index
+            while position < len(visible) and visible[position] == " ":
+                position += 1
+        else:
+            restored += segment + insert
+            position = max(position, index)
+    restored += visible[position:]
+    return markup.prefix + restored + markup.suffix
@@ -0,0 +1,165 @@
+# rate_limiter.py
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import openai
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+MAX_RATE_LIMIT_RETRIES = 5
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+        self.available -= amount
+        return -self.available / self.rate if self.available < 0 else 0.0
+
+class RateLimiter:
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_rate_limit_retries: int = MAX_RATE_LIMIT_RETRIES):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled_seconds = 0.0
+        self.rate_limited_responses = 0
+
+    def reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, 0.0)
+            if self._requests:
+                delay = max(delay, self._requests.reserve(1, now))
+            if self._tokens:
+                delay = max(delay, self._tokens.reserve(tokens, now))
+            self.throttled_seconds += delay
+            return delay
+
+    def acquire(self, tokens: int):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, seconds: float):
+        with self._lock:
+            self.rate_limited_responses += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "throttled_seconds": self.throttled_seconds,
+                "rate_limited_responses": self.rate_limited_responses
+            }
+
+_limit_entries: List[dict] = []
+_limiters: Dict[Tuple[str, str, str], RateLimiter] = {}
+_registry_lock = threading.Lock()
+
+def configure_rate_limits(entries: List[dict], max_rate_limit_retries: Optional[int] = None):
+    global MAX_RATE_LIMIT_RETRIES
+    with _registry_lock:
+        _limit_entries[:] = entries
+        _limiters.clear()
+    if max_rate_limit_retries is not None:
+        MAX_RATE_LIMIT_RETRIES = max_rate_limit_retries
+
+def _find_limits(api_base: str, model: str) -> dict:
+    api_base = api_base.rstrip("/")
+    for wanted_model in (model, "*"):
+        for entry in _limit_entries:
+            if entry.get("api_base", "*").rstrip("/") in (api_base, "*") and entry.get("model", "*") == wanted_model:
+                return entry
+    return {}
+
+# 服务商按 API Key 计算配额，同一端点与模型下的不同 Key 各用一个限流器；rpm/tpm 未指定时按 rate_limits 匹配
+def get_rate_limiter(api_base: str, model: str, api_key: str = "", rpm: Optional[float] = None, tpm: Optional[float] = None) -> RateLimiter:
+    key = (api_base, model, api_key)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limits = _find_limits(api_base, model)
+            limiter = RateLimiter(
+                limits.get("rpm", 0) if rpm is None else rpm,
+                limits.get("tpm", 0) if tpm is None else tpm,
+                MAX_RATE_LIMIT_RETRIES
+            )
+            _limiters[key] = limiter
+    return limiter
+
+def all_rate_limiter_stats() -> Dict[str, float]:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    totals = {"throttled_seconds": 0.0, "rate_limited_responses": 0}
+    for limiter in limiters:
+        for key, value in limiter.stats().items():
+            totals[key] += value
+    return totals
+
+def format_rate_limiter_stats() -> str:
+    stats = all_rate_limiter_stats()
+    return f"速率限制：收到 429 响应 {stats['rate_limited_responses']} 次，限流等待共 {stats['throttled_seconds']:.1f} 秒"
+
+def _parse_duration(value: str) -> Optional[float]:
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+def _header_delay(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        delay = _parse_duration(retry_after)
+        if delay is not None:
+            return delay
+    resets = [
+        _parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return isinstance(error, openai.RateLimitError)
+
+def retry_delay(error: Exception, retry_number: int) -> float:
+    delay = _header_delay(error)
+    if delay is not None:
+        return min(delay, BACKOFF_MAX_SECONDS) + random.uniform(0, 0.25)
+    ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (retry_number - 1))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
@@ -1,14 +1,21 @@
 # subtitle_parser.py
 import pysubs2
 import os
-from typing import List, Tuple, Optional
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple, Optional
+
+MEMORY_PER_SOURCE_BYTE = 5
+
+_KARAOKE_TAG_PATTERN = re.compile(r"\\(?:k|K|kf|ko)\d")
+_OVERRIDE_BLOCK_PATTERN = re.compile(r"\{[^}]*\}")
 
 class SubtitleHandlingError(Exception):
     pass
 
-def load_subtitles(filepath: str) -> Tuple[pysubs2.SSAFile, List[str]]:
-    if not os.path.exists(filepath):
-        raise FileNotFoundError(f"未找到输入文件: {filepath}")
+def _parse_subtitles(filepath: str) -> Tuple[pysubs2.SSAFile, List[str]]:
     try:
         subs = pysubs2.load(filepath)
         texts = [line.text for line in subs]
@@ -16,25 +23,161 @@ def load_subtitles(filepath: str) -> Tuple[pysubs2.SSAFile, List[str]]:
     except Exception as e:
         raise SubtitleHandlingError(f"加载字幕文件 {filepath} 时出错: {e}") from e
 
-def save_subtitles(subs: pysubs2.SSAFile, output_path: str, translated_texts: List[str], original_num_lines: Optional[int] = None):
-    if original_num_lines is None:
-        original_num_lines = len(subs)
+class DocumentCache:
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def get(self, filepath: str) -> Tuple[pysubs2.SSAFile, List[str]]:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"未找到输入文件: {filepath}")
+        stat = os.stat(filepath)
+        key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][:2]
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = Future()
+                self.misses += 1
+            else:
+                self.hits += 1
+        if not owner:
+            return pending.result()
+
+        try:
+            document = _parse_subtitles(filepath)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            self._store(key, document, stat.st_size * MEMORY_PER_SOURCE_BYTE)
+        pending.set_result(document)
+        return document
+
+    def _store(self, key, document, weight: int):
+        for stale in [k for k in self._entries if k[0] == key[0]]:
+            self.used_bytes -= self._entries.pop(stale)[2]
+        self._entries[key] = (*document, weight)
+        self.used_bytes += weight
+        while self.used_bytes > self.max_bytes and len(self._entries) > 1:
+            self.used_bytes -= self._entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+_document_cache = DocumentCache()
+
+def configure_document_cache(max_mb: float):
+    _document_cache.max_bytes = int(max_mb * 1024 * 1024)
 
+def load_subtitles(filepath: str, use_cache: bool = True) -> Tuple[pysubs2.SSAFile, List[str]]:
+    if not use_cache:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"未找到输入文件: {filepath}")
+        return _parse_subtitles(filepath)
+    subs, texts = _document_cache.get(filepath)
+    return subs, list(texts)
+
+def classify_event(event: pysubs2.SSAEvent, skip_styles=(), actor_pattern: Optional[re.Pattern] = None) -> Optional[str]:
+    if event.is_comment:
+        return "comment"
+    if "\\p" in event.text and event.is_drawing:
+        return "drawing"
+    if _KARAOKE_TAG_PATTERN.search(event.text):
+        return "karaoke"
+    if event.style.lower() in skip_styles or (actor_pattern and event.name and actor_pattern.search(event.name)):
+        return "style"
+    if not _OVERRIDE_BLOCK_PATTERN.sub("", event.text).replace("\\N", "").replace("\\h", "").strip():
+        return "empty"
+    return None
+
+def event_classifier(
+    skip_comments: bool = True,
+    skip_drawings: bool = True,
+    skip_karaoke: bool = True,
+    skip_styles: List[str] = (),
+    skip_actor_pattern: str = ""
+) -> Callable[[pysubs2.SSAEvent], Optional[str]]:
+    skipped_kinds = {"empty", "style"}
+    if skip_comments:
+        skipped_kinds.add("comment")
+    if skip_drawings:
+        skipped_kinds.add("drawing")
+    if skip_karaoke:
+        skipped_kinds.add("karaoke")
+    styles = {style.lower() for style in skip_styles}
+    try:
+        actor_pattern = re.compile(skip_actor_pattern) if skip_actor_pattern else None
+    except re.error as e:
+        raise SubtitleHandlingError(f"角色名正则表达式无效: {e}") from e
+
+    # 返回应跳过事件的类别，需要翻译时返回 None
+    def classify(event: pysubs2.SSAEvent) -> Optional[str]:
+        kind = classify_event(event, styles, actor_pattern)
+        return kind if kind in skipped_kinds else None
+    return classify
+
+def select_translatable_events(subs: pysubs2.SSAFile, **event_filter) -> Tuple[List[int], Dict[str, List[int]]]:
+    classify = event_classifier(**event_filter)
+    selected = []
+    skipped: Dict[str, List[int]] = {}
+    for i, event in enumerate(subs):
+        kind = classify(event)
+        if kind:
+            skipped.setdefault(kind, []).append(i)
+        else:
+            selected.append(i)
+    return selected, skipped
+
+def fit_translations(translated_texts: List[str], original_num_lines: int) -> List[str]:
     if len(translated_texts) < original_num_lines:
         print(f"警告: 翻译字幕行数 ({len(translated_texts)}) 少于原始行数 ({original_num_lines})，使用占位符填充。")
         translated_texts += ["⚠️[翻译缺失]"] * (original_num_lines - len(translated_texts))
     elif len(translated_texts) > original_num_lines:
         print(f"警告: 翻译字幕行数 ({len(translated_texts)}) 超出原始行数 ({original_num_lines})，截断。")
         translated_texts = translated_texts[:original_num_lines]
+    return translated_texts
+
+def save_subtitles(
+    subs: pysubs2.SSAFile,
+    output_path: str,
+    translated_texts: List[str],
+    original_num_lines: Optional[int] = None,
+    line_indices: Optional[List[int]] = None
+):
+    if line_indices is None:
+        line_indices = range(len(subs))
+    if original_num_lines is None:
+        original_num_lines = len(line_indices)
+    translated_texts = fit_translations(translated_texts, original_num_lines)
 
-    for i, line in enumerate(subs):
+    original_texts = [line.text for line in subs]
+    for i, line_index in enumerate(line_indices):
         if i < len(translated_texts):
-             line.text = translated_texts[i]
+             subs[line_index].text = translated_texts[i]
         else:
-             line.text = "⚠️[索引超出]"
+             subs[line_index].text = "⚠️[索引超出]"
 
     try:
         subs.save(output_path)
         print(f"字幕成功保存至 {output_path}")
     except Exception as e:
         raise SubtitleHandlingError(f"保存字幕文件 {output_path} 时出错: {e}") from e
+    finally:
+        for line, text in zip(subs, original_texts):
+            line.text = text
@@ -0,0 +1,281 @@
+# subtitle_stream.py
+# 超大字幕文件的流式读写：不构建完整的 SSAFile，按块逐行解析事件，保存时重新读取原文件并逐行替换文本，
+# 解析规则与 pysubs2 保持一致（ASS/SSA 额外遵循 [Events] 的 Format 行），事件序号与 load_subtitles 得到的 texts 一一对应。
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pysubs2
+
+from batching import estimate_tokens
+from subtitle_parser import SubtitleHandlingError, event_classifier, fit_translations, save_subtitles
+
+STREAMING_FORMATS = {".srt": "srt", ".ass": "ass", ".ssa": "ssa"}
+DEFAULT_CHUNK_EVENTS = 5000
+
+# 以下正则与常量按 pysubs2 1.8 的内部实现复制，避免依赖其非公开模块
+_TIMESTAMP = re.compile(r"(\d{1,2}):(\d{1,2}):(\d{1,2})[.,](\d{1,3})")
+_TIMESTAMP_SHORT = re.compile(r"(\d{1,2}):(\d{2}):(\d{2})")
+_SRT_MAX_TIME = 100 * 3_600_000 - 1
+_SECTION_HEADING = re.compile(r"^.{,3}\[[^]]*[a-z][^]]*]")
+_EVENT_FIELDS = {
+    "ass": ["layer", "start", "end", "style", "name", "marginl", "marginr", "marginv", "effect", "text"],
+    "ssa": ["marked", "start", "end", "style", "name", "marginl", "marginr", "marginv", "effect", "text"]
+}
+_OVERRIDE_SEQUENCE = re.compile(r"{[^}]*}")
+_OVERRIDE_TAG = re.compile(r"\\[ibusp][0-9]|\\r[a-zA-Z_0-9 ]*|\\fn[a-zA-Z_0-9 ]+")
+
+_SRT_INLINE_TAGS = [
+    (re.compile(r"< *i *>"), r"{\\i1}"), (re.compile(r"< */ *i *>"), r"{\\i0}"),
+    (re.compile(r"< *s *>"), r"{\\s1}"), (re.compile(r"< */ *s *>"), r"{\\s0}"),
+    (re.compile(r"< *u *>"), r"{\\u1}"), (re.compile(r"< */ *u *>"), r"{\\u0}"),
+    (re.compile(r"< *b *>"), r"{\\b1}"), (re.compile(r"< */ *b *>"), r"{\\b0}")
+]
+_SRT_OTHER_HTML_TAG = re.compile(r"< */? *[a-zA-Z][^>]*>")
+_SRT_NEXT_NUMBER = re.compile(r"\n+ *\d+ *$")
+_SRT_EMPTY_LINE = re.compile(r"\s*$")
+_SRT_NUMBER_LINE = re.compile(r"\s*\d+\s*$")
+_NON_TEXT_SECTIONS = ("Info", "Aegisub", "Fonts", "Graphics")
+
+def stream_format(filepath: str) -> Optional[str]:
+    return STREAMING_FORMATS.get(os.path.splitext(filepath)[1].lower())
+
+def should_stream(input_path: str, output_path: str, min_bytes: int) -> bool:
+    input_format = stream_format(input_path)
+    if not input_format or stream_format(output_path) != input_format or not os.path.exists(input_path):
+        return False
+    return os.path.getsize(input_path) >= min_bytes
+
+def _srt_text(lines: List[str]) -> str:
+    if len(lines) >= 2 and all(_SRT_EMPTY_LINE.match(line) for line in lines[:-1]) and _SRT_NUMBER_LINE.match(lines[-1]):
+        return ""
+    text = _SRT_NEXT_NUMBER.sub("", "".join(lines).strip())
+    if "<" in text:
+        for pattern, replacement in _SRT_INLINE_TAGS:
+            text = pattern.sub(replacement, text)
+        text = _SRT_OTHER_HTML_TAG.sub("", text)
+    return text.replace("\n", r"\N")
+
+def _timestamp_to_ms(groups) -> int:
+    if len(groups) == 4:
+        h, m, s, frac = map(int, groups)
+        ms = frac * 10 ** (3 - len(groups[-1]))
+    else:
+        h, m, s = map(int, groups)
+        ms = 0
+    return h * 3_600_000 + m * 60_000 + s * 1000 + ms
+
+# 按覆盖标签切分文本，给出每段是否处于斜体、下划线、删除线状态；\r 恢复默认样式，其余标签不影响 SRT 输出
+def _styled_fragments(text: str) -> Iterator[Tuple[str, dict]]:
+    fragments = _OVERRIDE_SEQUENCE.split(text)
+    overrides = _OVERRIDE_SEQUENCE.findall(text)
+    state = {"i": False, "u": False, "s": False}
+    yield fragments[0], dict(state)
+    for override, fragment in zip(overrides, fragments[1:]):
+        for tag in _OVERRIDE_TAG.findall(override):
+            if tag == r"\r":
+                state = dict.fromkeys(state, False)
+            elif tag[1] in state:
+                state[tag[1]] = "1" in tag
+        yield fragment, dict(state)
+
+def _srt_output_text(text: str) -> str:
+    text = text.replace(r"\h", " ").replace(r"\n", "\n").replace(r"\N", "\n")
+    if "{" in text:
+        fragments = []
+        for fragment, style in _styled_fragments(text):
+            for tag in ("i", "u", "s"):
+                if style[tag]:
+                    fragment = f"<{tag}>{fragment}</{tag}>"
+            fragments.append(fragment)
+        text = "".join(fragments)
+    return re.sub("\n+", "\n", text.strip())
+
+def _srt_timestamp(ms: int) -> str:
+    h, ms = divmod(min(max(ms, 0), _SRT_MAX_TIME), 3_600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+def _ass_time(value: str) -> int:
+    value = value.strip()
+    sign = -1 if value.startswith("-") else 1
+    value = value.lstrip("-")
+    match = _TIMESTAMP.match(value) or _TIMESTAMP_SHORT.match(value)
+    if match is None:
+        raise ValueError(f"无法解析时间戳: {value!r}")
+    return sign * _timestamp_to_ms(match.groups())
+
+# 逐行扫描，产出 (事件, 事件行中文本字段之前的部分, 原始行)；非事件行的事件为 None，写出时原样保留
+def _scan_srt(fp) -> Iterator[Tuple[Optional[pysubs2.SSAEvent], Optional[str], Optional[str]]]:
+    timing = None
+    following = []
+    for line in fp:
+        stamps = _TIMESTAMP.findall(line)
+        if len(stamps) == 2:
+            if timing is not None:
+                yield pysubs2.SSAEvent(start=timing[0], end=timing[1], text=_srt_text(following)), None, None
+            timing = [_timestamp_to_ms(stamp) for stamp in stamps]
+            following = []
+        elif timing is not None:
+            following.append(line)
+    if timing is not None:
+        yield pysubs2.SSAEvent(start=timing[0], end=timing[1], text=_srt_text(following)), None, None
+
+def _scan_substation(fp, format_: str) -> Iterator[Tuple[Optional[pysubs2.SSAEvent], Optional[str], str]]:
+    fields = _EVENT_FIELDS[format_]
+    in_text_section = True
+    in_events_section = False
+    for raw_line in fp:
+        line = raw_line.strip()
+        if _SECTION_HEADING.match(line):
+            in_text_section = not any(name in line for name in _NON_TEXT_SECTIONS)
+            in_events_section = "Events" in line
+        elif in_events_section and line.startswith("Format:"):
+            # 按文件自身的 Format 行确定字段顺序，Text 须为最后一个字段，否则沿用标准顺序
+            declared = [name.strip().lower() for name in line[len("Format:"):].split(",")]
+            if declared[-1] == "text":
+                fields = declared
+        elif in_text_section and line.startswith(("Dialogue:", "Comment:")):
+            event_type, rest = line.split(":", 1)
+            values = rest.strip().split(",", len(fields) - 1)
+            record = dict(zip(fields, values))
+            event = pysubs2.SSAEvent(
+                type=event_type,
+                start=_ass_time(record["start"]) if "start" in record else 0,
+                end=_ass_time(record["end"]) if "end" in record else 0,
+                style=record.get("style", "Default"),
+                name=record.get("name", ""),
+                effect=record.get("effect", ""),
+                text=record.get("text", "")
+            )
+            # 字段不全的事件行无法替换文本，写出时保留原样
+            prefix = f"{event_type}: {','.join(values[:-1])}," if len(values) == len(fields) else None
+            yield event, prefix, raw_line
+            continue
+        yield None, None, raw_line
+
+def _scan(fp, format_: str):
+    return _scan_srt(fp) if format_ == "srt" else _scan_substation(fp, format_)
+
+def iter_event_chunks(filepath: str, chunk_size: int = DEFAULT_CHUNK_EVENTS) -> Iterator[List[pysubs2.SSAEvent]]:
+    format_ = stream_format(filepath)
+    if format_ is None:
+        raise SubtitleHandlingError(f"流式读取仅支持 .srt / .ass / .ssa 文件: {filepath}")
+    chunk = []
+    try:
+        with open(filepath, encoding="utf-8") as fp:
+            for event, _, _ in _scan(fp, format_):
+                if event is None:
+                    continue
+                chunk.append(event)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        raise SubtitleHandlingError(f"加载字幕文件 {filepath} 时出错: {e}") from e
+    if chunk:
+        yield chunk
+
+class StreamedSubtitles:
+    def __init__(self, filepath: str, event_count: int, chunk_size: int = DEFAULT_CHUNK_EVENTS,
+                 line_indices: Optional[List[int]] = None, skipped_events: Optional[Dict[str, List[int]]] = None,
+                 skipped_tokens: int = 0):
+        self.filepath = filepath
+        self.event_count = event_count
+        self.chunk_size = chunk_size
+        self.line_indices = line_indices if line_indices is not None else list(range(event_count))
+        self.skipped_events = skipped_events or {}
+        self.skipped_tokens = skipped_tokens
+
+    def __len__(self):
+        return self.event_count
+
+    def __iter__(self):
+        for chunk in iter_event_chunks(self.filepath, self.chunk_size):
+            yield from chunk
+
+# 读取的同时按 event_filter 筛选事件，只保留需要翻译的文本，不再为筛选重新解析整个文件；
+# 返回的 texts 与文档的 line_indices 一一对应，event_filter 为 None 时保留全部事件
+def load_subtitles_streaming(filepath: str, chunk_size: int = DEFAULT_CHUNK_EVENTS,
+                             event_filter: Optional[dict] = None) -> Tuple[StreamedSubtitles, List[str]]:
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"未找到输入文件: {filepath}")
+    classify = event_classifier(**event_filter) if event_filter is not None else None
+    texts = []
+    line_indices = []
+    skipped_events = {}
+    skipped_tokens = 0
+    event_count = 0
+    for chunk in iter_event_chunks(filepath, chunk_size):
+        for event in chunk:
+            kind = classify(event) if classify else None
+            if kind:
+                skipped_events.setdefault(kind, []).append(event_count)
+                skipped_tokens += estimate_tokens(event.text)
+            else:
+                line_indices.append(event_count)
+                texts.append(event.text)
+            event_count += 1
+    return StreamedSubtitles(filepath, event_count, chunk_size, line_indices, skipped_events, skipped_tokens), texts
+
+def _write_events(fp_in, fp_out, format_: str, replacements: Iterator[Tuple[int, str]], chunk_size: int):
+    next_index, next_text = next(replacements, (None, None))
+    buffer = []
+    event_index = -1
+    srt_number = 0
+    for event, prefix, raw_line in _scan(fp_in, format_):
+        if event is not None:
+            event_index += 1
+            replaced = event_index == next_index
+            if replaced:
+                event.text = next_text
+                next_index, next_text = next(replacements, (None, None))
+            if format_ == "srt":
+                if "\\p" in event.text and event.is_drawing:
+                    continue
+                srt_number += 1
+                buffer.append(f"{srt_number}\n{_srt_timestamp(event.start)} --> {_srt_timestamp(event.end)}\n{_srt_output_text(event.text)}\n\n")
+            elif replaced and prefix is not None:
+                buffer.append(f"{prefix}{event.text}\n")
+            else:
+                buffer.append(raw_line)
+        else:
+            buffer.append(raw_line)
+        if len(buffer) >= chunk_size:
+            fp_out.writelines(buffer)
+            buffer.clear()
+    fp_out.writelines(buffer)
+
+def save_subtitles_streaming(
+    document: StreamedSubtitles,
+    output_path: str,
+    translated_texts: List[str],
+    original_num_lines: Optional[int] = None,
+    line_indices: Optional[List[int]] = None
+):
+    if stream_format(output_path) != stream_format(document.filepath):
+        try:
+            subs = pysubs2.load(document.filepath)
+        except Exception as e:
+            raise SubtitleHandlingError(f"加载字幕文件 {document.filepath} 时出错: {e}") from e
+        save_subtitles(subs, output_path, translated_texts, original_num_lines, line_indices)
+        return
+    if line_indices is None:
+        line_indices = range(len(document))
+    if original_num_lines is None:
+        original_num_lines = len(line_indices)
+    translated_texts = fit_translations(translated_texts, original_num_lines)
+
+    # line_indices 由 select_translatable_events 按事件顺序给出，写出时只需顺序推进
+    replacements = iter(zip(line_indices, translated_texts))
+    temp_path = f"{output_path}.tmp"
+    try:
+        with open(document.filepath, encoding="utf-8") as fp_in, open(temp_path, "w", encoding="utf-8") as fp_out:
+            _write_events(fp_in, fp_out, stream_format(document.filepath), replacements, document.chunk_size)
+        os.replace(temp_path, output_path)
+        print(f"字幕成功保存至 {output_path}")
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise SubtitleHandlingError(f"保存字幕文件 {output_path} 时出错: {e}") from e
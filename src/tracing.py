@@ -0,0 +1,82 @@
+# tracing.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+JOB_TRACK = 0
+WINDOW_TRACK_BASE = 1000
+
+def add_span(stats: dict, name: str, start: float, end: Optional[float] = None, **args):
+    stats.setdefault("spans", []).append((name, start, end if end is not None else time.time(), args))
+
+# Chrome Trace Event 格式，可用 Perfetto 或 chrome://tracing 打开：
+# 任务级阶段共用一条轨道，每个窗口单独一条轨道，窗口内的子阶段嵌套在窗口之下。
+class Tracer:
+    def __init__(self, enabled: bool = False, process_name: str = ""):
+        self.enabled = enabled
+        self.pid = os.getpid()
+        self.events = []
+        self._tracks = set()
+        self._lock = threading.Lock()
+        if enabled:
+            self._name_process(process_name)
+            self._name_track(JOB_TRACK, "任务")
+
+    def _name_process(self, name: str):
+        self.events.append({"name": "process_name", "ph": "M", "pid": self.pid, "tid": JOB_TRACK, "args": {"name": name}})
+
+    def _name_track(self, tid: int, name: str):
+        if tid not in self._tracks:
+            self._tracks.add(tid)
+            self.events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}})
+            self.events.append({"name": "thread_sort_index", "ph": "M", "pid": self.pid, "tid": tid, "args": {"sort_index": tid}})
+
+    def add(self, name: str, start: float, end: float, category: str = "stage", tid: int = JOB_TRACK, **args):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round(start * 1_000_000),
+                "dur": max(0, round((end - start) * 1_000_000)),
+                "pid": self.pid,
+                "tid": tid,
+                "args": args
+            })
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.time(), **args)
+
+    def add_window(self, window_index: int, start: float, end: float, stats: dict, **args):
+        if not self.enabled:
+            return
+        tid = WINDOW_TRACK_BASE + window_index
+        spans = stats.get("spans", [])
+        with self._lock:
+            self._name_track(tid, f"窗口 {window_index + 1}")
+        start = min([start] + [span[1] for span in spans])
+        self.add("window", start, end, category="window", tid=tid, window=window_index + 1, **args)
+        for name, span_start, span_end, span_args in spans:
+            self.add(name, span_start, span_end, category="window", tid=tid, window=window_index + 1, **span_args)
+
+    def save(self, path: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for event in events:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            else:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
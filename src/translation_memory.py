@@ -0,0 +1,83 @@
+# translation_memory.py
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from preprocess import normalize_text
+
+TRANSLATION_MEMORY_FILE = "translation_memory.db"
+
+def memory_key(text: str, source_language: str, target_language: str, model: str, system_prompt: str) -> str:
+    payload = "\x1f".join([normalize_text(text), source_language, target_language, model, system_prompt])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class TranslationMemory:
+    def __init__(self, path: str = TRANSLATION_MEMORY_FILE, max_entries: int = 200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.commit()
+
+    def lookup_many(self, texts: Sequence[str], source_language: str, target_language: str, model: str, system_prompt: str) -> Dict[int, str]:
+        keys = [memory_key(t, source_language, target_language, model, system_prompt) for t in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = list(set(keys[start : start + 500]))
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, translation FROM entries WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+
+        hits = {i: found[k] for i, k in enumerate(keys) if k in found}
+        self.hits += len(hits)
+        self.misses += len(keys) - len(hits)
+        return hits
+
+    def store_many(self, pairs: List[Tuple[str, str]], source_language: str, target_language: str, model: str, system_prompt: str):
+        now = time.time()
+        rows = [
+            (memory_key(src, source_language, target_language, model, system_prompt), dst, now)
+            for src, dst in pairs if dst
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO entries (key, translation, last_used) VALUES (?, ?, ?)", rows)
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self.evicted += excess
+            self._conn.commit()
+
+    def entry_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evicted": self.evicted, "entries": self.entry_count()}
+
+    def format_stats(self) -> str:
+        stats = self.stats()
+        return f"翻译记忆：命中 {stats['hits']} 行，未命中 {stats['misses']} 行，淘汰 {stats['evicted']} 条，共 {stats['entries']} 条记录"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
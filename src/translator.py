@@ -1,28 +1,288 @@
 # translator.py
+import asyncio
 import openai
 import re
+import threading
 import time
-from typing import List, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, List, Tuple, Optional
 
-SYSTEM_PROMPT_TEMPLATE = (
-    "将以下{context}**{source_language}**字幕逐行翻译为**{target_language}**。"
+from client_pool import get_client, get_async_client
+from batching import estimate_tokens
+from rate_limiter import RateLimiter, get_rate_limiter, is_rate_limit_error, retry_delay
+from backend_pool import BackendPool, build_backend_pool
+from hedging import HedgePolicy
+from tracing import add_span
+from metrics import observe_attempts
+from usage import USAGE_KEYS
+
+# 固定不变的规则放在最前面，随文件变化的语言、背景与摘要放在最后，
+# 使所有窗口（以及不同文件之间）的提示词前缀逐字节一致，便于服务商缓存。
+TRANSLATION_RULES = (
+    "你是字幕翻译助手，负责逐行翻译字幕。"
     "每行格式为 [数字] 内容。保持行数一致，仅翻译内容部分，不要更改编号和格式。"
+    "行内的 {{1}}、{{2}} 等是格式占位符，请原样保留在译文中对应的位置。"
     "例如，输入 '[1] Hello world'，如果目标语言是法语，你应该只输出 '[1] Bonjour le monde'。"
     "请确保严格按照此格式输出，不要添加任何额外的解释或注释。"
 )
 
-SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE = (
-    "你将处理的是**{source_language}**字幕的逐行翻译任务，目标语言为**{target_language}**。\n\n"
+SYSTEM_PROMPT_TEMPLATE = TRANSLATION_RULES + (
+    "\n\n请将以下{context}**{source_language}**字幕逐行翻译为**{target_language}**。"
+)
+
+SYSTEM_PROMPT_WITH_SUMMARY_TEMPLATE = TRANSLATION_RULES + (
+    "\n\n你将处理的是**{source_language}**字幕的逐行翻译任务，目标语言为**{target_language}**。"
     "为了更准确地把握语境，以下是完整字幕的简要内容摘要：\n{summary}\n\n"
     "请据此进行逐行翻译。"
-    "每行格式为 [数字] 内容。保持行数一致，仅翻译内容部分，不要更改编号和格式。"
-    "例如，输入 '[1] Hello world'，如果目标语言是法语，你应该只输出 '[1] Bonjour le monde'。"
-    "请确保严格按照此格式输出，不要添加任何额外的解释或注释。"
 )
 
+REPAIR_PROMPT_TEMPLATE = (
+    "以下是相邻行的原文与已有译文，仅供参考，请勿翻译或输出这些行：\n{context}\n\n"
+    "请翻译下列各行：\n{numbered}"
+)
+
+REPAIR_CONTEXT_LINES = 1
+STREAM_MAX_UNFORMATTED_LINES = 3
+
 class TranslationError(Exception):
     pass
 
+def _number_lines(texts: List[str]) -> str:
+    return "\n".join(f"[{i+1}] {line}" for i, line in enumerate(texts))
+
+def _extract_numbered_lines(raw_translation: str, count: int) -> dict:
+    extracted = {}
+    for idx_str, content in re.findall(r"\[(\d+)]\s*(.*)", raw_translation):
+        idx = int(idx_str) - 1
+        if 0 <= idx < count and idx not in extracted:
+            extracted[idx] = content.strip()
+    return extracted
+
+def _repair_content(texts: List[str], translated_lines: List[str], missing: List[int]) -> str:
+    missing_set = set(missing)
+    context_indices = sorted({
+        j
+        for i in missing
+        for j in range(i - REPAIR_CONTEXT_LINES, i + REPAIR_CONTEXT_LINES + 1)
+        if 0 <= j < len(texts) and j not in missing_set
+    })
+    numbered = _number_lines([texts[i] for i in missing])
+    if not context_indices:
+        return numbered
+    context = "\n".join(f"{texts[j]} => {translated_lines[j]}" for j in context_indices)
+    return REPAIR_PROMPT_TEMPLATE.format(context=context, numbered=numbered)
+
+def _usage_dict(usage) -> Optional[dict]:
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": usage.prompt_tokens or 0,
+        "completion_tokens": usage.completion_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", None) or 0) if details else 0
+    }
+
+def _record_usage(stats: dict, usage: Optional[dict], retry: bool = False):
+    if not usage:
+        return
+    for key, value in usage.items():
+        stats[key] = stats.get(key, 0) + value
+        if retry:
+            stats[f"retry_{key}"] = stats.get(f"retry_{key}", 0) + value
+
+# 切换后端时，之前失败的后端已产生的用量与计数不能丢弃：并入窗口统计，并按各自模型单独记录供计费
+def _merge_failover_stats(stats: dict, failed_attempts: List[dict]):
+    for failed_stats in failed_attempts:
+        for key in USAGE_KEYS + ("attempts", "rate_limited", "errors"):
+            stats[key] = stats.get(key, 0) + failed_stats.get(key, 0)
+    if failed_attempts:
+        stats["failover_usage"] = [
+            {"model": failed_stats.get("model", ""), **{key: failed_stats.get(key, 0) for key in USAGE_KEYS}}
+            for failed_stats in failed_attempts
+        ]
+
+def _estimate_request_usage(messages) -> dict:
+    system_tokens = estimate_tokens(messages[0]["content"])
+    user_tokens = estimate_tokens(messages[1]["content"])
+    return {"prompt_tokens": system_tokens + user_tokens, "cached_tokens": 0, "completion_tokens": user_tokens}
+
+def _estimate_request_tokens(messages) -> int:
+    usage = _estimate_request_usage(messages)
+    return usage["prompt_tokens"] + usage["completion_tokens"]
+
+def _window_prompt(system_prompt: str) -> str:
+    return system_prompt.strip() or SYSTEM_PROMPT_TEMPLATE.format(context="")
+
+def estimate_window_usage(texts: List[str], system_prompt: str) -> dict:
+    return _estimate_request_usage([
+        {"role": "system", "content": _window_prompt(system_prompt)},
+        {"role": "user", "content": _number_lines(texts)}
+    ])
+
+def _translation_attempts(texts: List[str], system_prompt: str, max_retries: int, stats: dict, rate_limiter: RateLimiter,
+                          can_spend: Optional[Callable[[dict], bool]] = None):
+    stats.update({"attempts": 0, "truncated": False, "rate_limited": 0, "errors": 0})
+    prompt = _window_prompt(system_prompt)
+    translated_lines = [""] * len(texts)
+    missing = list(range(len(texts)))
+
+    attempt = 0
+    while attempt <= max_retries:
+        if len(missing) == len(texts):
+            user_content = _number_lines(texts)
+        else:
+            user_content = _repair_content(texts, translated_lines, missing)
+        messages = [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": user_content}
+        ]
+        # 首次请求的用量已在派发窗口时预留，重试前确认剩余预算足够
+        if attempt > 0 and can_spend and not can_spend(_estimate_request_usage(messages)):
+            return _prepare_failure_output(texts, f"⚠️ 已达到预算上限，停止重试 (仍缺 {len(missing)} 行)", translated_lines)
+
+        delay = rate_limiter.reserve(_estimate_request_tokens(messages))
+        if delay > 0:
+            wait_start = time.time()
+            yield ("sleep", delay)
+            add_span(stats, "rate_limit_wait", wait_start, attempt=attempt + 1)
+
+        stats["attempts"] = attempt + 1
+        span_name = "request" if attempt == 0 else "retry_request"
+        request_start = time.time()
+        reply = None
+        try:
+            reply = yield ("request", {"messages": messages, "line_indices": list(missing)})
+            add_span(stats, span_name, request_start, attempt=attempt + 1, lines=len(missing), finish_reason=reply["finish_reason"])
+            if reply.get("first_token_at"):
+                add_span(stats, "time_to_first_token", request_start, reply["first_token_at"], attempt=attempt + 1)
+            _record_usage(stats, reply.get("usage"), retry=attempt > 0)
+            if reply["finish_reason"] == "length":
+                stats["truncated"] = True
+            elif reply["finish_reason"] == "derailed":
+                stats["derailed"] = stats.get("derailed", 0) + 1
+            parse_start = time.time()
+            for local_idx, content in _extract_numbered_lines(reply["content"], len(missing)).items():
+                translated_lines[missing[local_idx]] = content
+            missing = [i for i, line in enumerate(translated_lines) if not line]
+            add_span(stats, "parse", parse_start, attempt=attempt + 1, missing=len(missing))
+            if not missing:
+                return translated_lines, None
+        except Exception as e:
+            if reply is None:
+                add_span(stats, span_name, request_start, attempt=attempt + 1, lines=len(missing), error=type(e).__name__)
+            if is_rate_limit_error(e) and stats["rate_limited"] < rate_limiter.max_rate_limit_retries:
+                stats["rate_limited"] += 1
+                rate_limiter.penalize(retry_delay(e, stats["rate_limited"]))
+                continue
+            stats["errors"] += 1
+            if attempt >= max_retries:
+                return _prepare_failure_output(texts, f"异常: {e}", translated_lines)
+            backoff_start = time.time()
+            yield ("sleep", retry_delay(e, attempt + 1))
+            add_span(stats, "retry_backoff", backoff_start, attempt=attempt + 1)
+        attempt += 1
+
+    final_warning = f"⚠️ 翻译失败或行数不一致 (尝试 {max_retries + 1} 次后仍缺 {len(missing)} 行)"
+    return _prepare_failure_output(texts, final_warning, translated_lines)
+
+def _completion_reply(response) -> dict:
+    choice = response.choices[0]
+    return {"content": choice.message.content, "finish_reason": choice.finish_reason, "usage": _usage_dict(response.usage)}
+
+class _StreamCollector:
+    def __init__(self, line_indices: List[int], on_line: Optional[Callable[[int, str], None]], stats: dict):
+        self.line_indices = line_indices
+        self.on_line = on_line
+        self.stats = stats
+        self.started = time.time()
+        self.parts = []
+        self.buffer = ""
+        self.seen = set()
+        self.unformatted_lines = 0
+        self.derailed = False
+        self.finish_reason = None
+        self.first_token_at = None
+        self.usage = None
+
+    def feed_chunk(self, chunk):
+        if getattr(chunk, "usage", None):
+            self.usage = _usage_dict(chunk.usage)
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.delta and choice.delta.content:
+            if self.first_token_at is None:
+                self.first_token_at = time.time()
+            self.parts.append(choice.delta.content)
+            self.buffer += choice.delta.content
+            while "\n" in self.buffer and not self.derailed:
+                line, self.buffer = self.buffer.split("\n", 1)
+                self._handle_line(line)
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+    def _handle_line(self, line: str):
+        if not line.strip():
+            return
+        match = re.search(r"\[(\d+)]\s*(.*)", line)
+        if not match:
+            self.unformatted_lines += 1
+            self.derailed = self.unformatted_lines >= STREAM_MAX_UNFORMATTED_LINES
+            return
+        idx = int(match.group(1)) - 1
+        if not 0 <= idx < len(self.line_indices):
+            self.derailed = True
+            return
+        content = match.group(2).strip()
+        if content and idx not in self.seen:
+            self.seen.add(idx)
+            self.stats.setdefault("time_to_first_line", time.time() - self.started)
+            if self.on_line:
+                self.on_line(self.line_indices[idx], content)
+
+    def reply(self) -> dict:
+        if not self.derailed and self.buffer:
+            self._handle_line(self.buffer)
+        finish_reason = "derailed" if self.derailed else self.finish_reason
+        return {"content": "".join(self.parts), "finish_reason": finish_reason, "usage": self.usage, "first_token_at": self.first_token_at}
+
+def _run_attempts(steps, request):
+    reply = None
+    error = None
+    while True:
+        try:
+            action, payload = steps.throw(error) if error else steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        if action == "sleep":
+            time.sleep(payload)
+            continue
+        try:
+            reply = request(payload)
+        except Exception as e:
+            error = e
+
+async def _run_attempts_async(steps, request):
+    reply = None
+    error = None
+    while True:
+        try:
+            action, payload = steps.throw(error) if error else steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        if action == "sleep":
+            await asyncio.sleep(payload)
+            continue
+        try:
+            reply = await request(payload)
+        except Exception as e:
+            error = e
+
+def _bind_model(can_spend, model: str):
+    return (lambda usage: can_spend(usage, model)) if can_spend else None
+
 def translate_batch(
     texts: List[str],
     api_key: str,
@@ -30,58 +290,391 @@ def translate_batch(
     model: str,
     system_prompt: str,
     temperature: float = 1.3,
-    max_retries: int = 1
+    max_retries: int = 1,
+    stats: Optional[dict] = None,
+    stream: bool = False,
+    on_line: Optional[Callable[[int, str], None]] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    can_spend: Optional[Callable[[dict, str], bool]] = None
 ) -> Tuple[List[str], Optional[str]]:
-    client = openai.OpenAI(
-        base_url=api_base,
-        api_key=api_key,
-    )
-
-    numbered_texts = [f"[{i+1}] {line}" for i, line in enumerate(texts)]
-    combined_text = "\n".join(numbered_texts)
+    client = get_client(api_base, api_key)
+    rate_limiter = rate_limiter or get_rate_limiter(api_base, model, api_key)
+    stats = stats if stats is not None else {}
 
-    prompt = system_prompt.strip() or SYSTEM_PROMPT_TEMPLATE.format(context="")
+    def get_translation_attempt(request):
+        if not stream:
+            response = client.chat.completions.create(
+                model=model,
+                temperature=temperature,
+                messages=request["messages"]
+            )
+            return _completion_reply(response)
 
-    def get_translation_attempt():
+        collector = _StreamCollector(request["line_indices"], on_line, stats)
         response = client.chat.completions.create(
             model=model,
             temperature=temperature,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": combined_text}
-            ]
+            messages=request["messages"],
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        return response.choices[0].message.content
+        try:
+            for chunk in response:
+                collector.feed_chunk(chunk)
+                if collector.derailed:
+                    break
+        finally:
+            response.close()
+        return collector.reply()
+
+    steps = _translation_attempts(texts, system_prompt, max_retries, stats, rate_limiter, _bind_model(can_spend, model))
+    return _run_attempts(steps, get_translation_attempt)
 
-    for attempt in range(max_retries + 1):
+async def translate_batch_async(
+    texts: List[str],
+    client: openai.AsyncOpenAI,
+    model: str,
+    system_prompt: str,
+    temperature: float = 1.3,
+    max_retries: int = 1,
+    stats: Optional[dict] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    stream: bool = False,
+    on_line: Optional[Callable[[int, str], None]] = None,
+    can_spend: Optional[Callable[[dict, str], bool]] = None
+) -> Tuple[List[str], Optional[str]]:
+    stats = stats if stats is not None else {}
+
+    async def get_translation_attempt(request):
+        if not stream:
+            response = await client.chat.completions.create(
+                model=model,
+                temperature=temperature,
+                messages=request["messages"]
+            )
+            return _completion_reply(response)
+
+        collector = _StreamCollector(request["line_indices"], on_line, stats)
+        response = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=request["messages"],
+            stream=True,
+            stream_options={"include_usage": True}
+        )
         try:
-            raw_translation = get_translation_attempt()
-            extracted = re.findall(r"\[(\d+)]\s*(.*)", raw_translation)
-            translated_lines = [""] * len(texts)
-
-            processed_indices = set()
-            for idx_str, content in extracted:
-                try:
-                    idx = int(idx_str) - 1
-                    if 0 <= idx < len(texts) and idx not in processed_indices:
-                        translated_lines[idx] = content.strip()
-                        processed_indices.add(idx)
-                except ValueError:
-                    continue
-
-            if len(processed_indices) == len(texts) and all(translated_lines):
-                return translated_lines, None
+            async for chunk in response:
+                collector.feed_chunk(chunk)
+                if collector.derailed:
+                    break
+        finally:
+            await response.close()
+        return collector.reply()
 
-            warning_msg = f"行数不一致或提取不完整 (尝试 {attempt + 1}/{max_retries + 1})"
-            if attempt < max_retries:
-                time.sleep(1)
-        except Exception as e:
-            if attempt >= max_retries:
-                return _prepare_failure_output(texts, f"异常: {e}")
-            time.sleep(1)
+    steps = _translation_attempts(texts, system_prompt, max_retries, stats, rate_limiter or RateLimiter(), _bind_model(can_spend, model))
+    return await _run_attempts_async(steps, get_translation_attempt)
+
+def _backend_failed(warning_msg: Optional[str], stats: dict) -> bool:
+    return bool(warning_msg) and stats.get("errors", 0) > 0
+
+def _backend_rate_limiter(backend) -> RateLimiter:
+    return get_rate_limiter(backend.api_base, backend.model, backend.api_key, backend.rpm, backend.tpm)
+
+def _translate_on_backend(backend_pool, backend, hedge_policy, texts, system_prompt, temperature, max_retries, stream, on_line, can_spend):
+    stats = {"backend": backend.name, "model": backend.model}
+    start_time = time.time()
+    failed = True
+    try:
+        batch_translated, warning_msg = translate_batch(
+            texts=texts,
+            api_key=backend.api_key,
+            api_base=backend.api_base,
+            model=backend.model,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_retries=max_retries,
+            stats=stats,
+            stream=stream,
+            on_line=on_line,
+            rate_limiter=_backend_rate_limiter(backend),
+            can_spend=can_spend
+        )
+        failed = _backend_failed(warning_msg, stats)
+    finally:
+        duration = time.time() - start_time
+        backend_pool.release(backend, duration, len(texts), not failed)
+        observe_attempts(backend.name, stats)
+    if hedge_policy and not failed:
+        hedge_policy.record(duration, len(texts))
+    return batch_translated, warning_msg, stats, failed
+
+async def _translate_on_backend_async(backend_pool, backend, hedge_policy, texts, system_prompt, temperature, max_retries, stream, on_line, can_spend):
+    stats = {"backend": backend.name, "model": backend.model}
+    start_time = time.time()
+    failed = True
+    cancelled = False
+    try:
+        batch_translated, warning_msg = await translate_batch_async(
+            texts=texts,
+            client=get_async_client(backend.api_base, backend.api_key),
+            model=backend.model,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_retries=max_retries,
+            stats=stats,
+            rate_limiter=_backend_rate_limiter(backend),
+            stream=stream,
+            on_line=on_line,
+            can_spend=can_spend
+        )
+        failed = _backend_failed(warning_msg, stats)
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        duration = time.time() - start_time
+        if cancelled:
+            backend_pool.cancel(backend)
+        else:
+            backend_pool.release(backend, duration, len(texts), not failed)
+            observe_attempts(backend.name, stats)
+    if hedge_policy and not failed:
+        hedge_policy.record(duration, len(texts))
+    return batch_translated, warning_msg, stats, failed
+
+def _acquire_hedge_backend(backend_pool: BackendPool, hedge_policy: HedgePolicy, primary, texts, system_prompt, can_spend):
+    # 对冲请求会重复消耗 token，预算不足时不发送
+    if can_spend and not can_spend(estimate_window_usage(texts, system_prompt), primary.model):
+        return None
+    if not hedge_policy.try_start_hedge():
+        return None
+    # 其他后端均已满载时放弃对冲，不占用原后端或突破并发上限
+    backend = backend_pool.try_acquire(exclude=[primary])
+    if backend is None:
+        hedge_policy.cancel_hedge()
+    return backend
+
+def _pick_result(results, hedged):
+    for position, result in results:
+        if not result[1]:
+            if position == 1:
+                hedged["won"] = True
+            return result
+    return None
+
+def _record_losers(hedge_policy, results, winner):
+    for result in results:
+        if result is not winner:
+            hedge_policy.record_loser(result[2])
+
+def _mark_hedged(result, hedged, hedge_policy):
+    if hedged:
+        result[2]["hedged"] = True
+        if hedged.get("won"):
+            result[2]["hedge_won"] = True
+            hedge_policy.hedge_won()
+    return result
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+        return _hedge_executor
+
+def _translate_hedged(backend_pool, backend, hedge_policy, texts, *args):
+    delay = hedge_policy.delay(len(texts))
+    if delay is None:
+        return _translate_on_backend(backend_pool, backend, hedge_policy, texts, *args)
+
+    executor = _get_hedge_executor()
+    futures = {executor.submit(_translate_on_backend, backend_pool, backend, hedge_policy, texts, *args): 0}
+    hedged = {}
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        hedge_backend = _acquire_hedge_backend(backend_pool, hedge_policy, backend, texts, args[0], args[-1])
+        if hedge_backend:
+            hedged["started"] = True
+            futures[executor.submit(_translate_on_backend, backend_pool, hedge_backend, hedge_policy, texts, *args)] = 1
+
+    first = None
+    results = []
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        finished = [(futures[f], f.result()) for f in done]
+        results.extend(r for _, r in finished)
+        first = first or finished[0][1]
+        result = _pick_result(finished, hedged)
+        if result:
+            break
+    else:
+        result = first
+    _record_losers(hedge_policy, results, result)
+    for future in pending:
+        hedge_policy.track_loser(future)
+    return _mark_hedged(result, hedged, hedge_policy)
+
+async def _translate_hedged_async(backend_pool, backend, hedge_policy, texts, *args):
+    delay = hedge_policy.delay(len(texts))
+    if delay is None:
+        return await _translate_on_backend_async(backend_pool, backend, hedge_policy, texts, *args)
+
+    tasks = {asyncio.ensure_future(_translate_on_backend_async(backend_pool, backend, hedge_policy, texts, *args)): 0}
+    hedged = {}
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if not done:
+        hedge_backend = _acquire_hedge_backend(backend_pool, hedge_policy, backend, texts, args[0], args[-1])
+        if hedge_backend:
+            hedged["started"] = True
+            tasks[asyncio.ensure_future(_translate_on_backend_async(backend_pool, hedge_backend, hedge_policy, texts, *args))] = 1
+
+    first = None
+    results = []
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            finished = [(tasks[t], t.result()) for t in done]
+            results.extend(r for _, r in finished)
+            first = first or finished[0][1]
+            result = _pick_result(finished, hedged)
+            if result:
+                break
+        else:
+            result = first
+        _record_losers(hedge_policy, results, result)
+        return _mark_hedged(result, hedged, hedge_policy)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+# 改派到其他后端相当于重发整个窗口，按刚失败后端的模型估算是否仍在预算内
+def _can_fail_over(texts, system_prompt, backend, can_spend) -> bool:
+    return not can_spend or can_spend(estimate_window_usage(texts, system_prompt), backend.model)
+
+def translate_batch_pooled(
+    texts: List[str],
+    backend_pool: BackendPool,
+    system_prompt: str,
+    temperature: float = 1.3,
+    max_retries: int = 1,
+    stats: Optional[dict] = None,
+    stream: bool = False,
+    on_line: Optional[Callable[[int, str], None]] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    can_spend: Optional[Callable[[dict, str], bool]] = None
+) -> Tuple[List[str], Optional[str]]:
+    stats = stats if stats is not None else {}
+    if hedge_policy:
+        hedge_policy.window_started()
+    tried = []
+    spans = []
+    failed_attempts = []
+    while True:
+        wait_start = time.time()
+        backend = backend_pool.acquire(exclude=tried)
+        spans.append(("backend_wait", wait_start, time.time(), {"backend": backend.name}))
+        tried.append(backend)
+        args = (texts, system_prompt, temperature, max_retries, stream, on_line, can_spend)
+        if hedge_policy:
+            batch_translated, warning_msg, attempt_stats, failed = _translate_hedged(backend_pool, backend, hedge_policy, *args)
+        else:
+            batch_translated, warning_msg, attempt_stats, failed = _translate_on_backend(backend_pool, backend, None, *args)
+        spans.extend(attempt_stats.pop("spans", []))
+        stats.clear()
+        stats.update(attempt_stats, spans=spans)
+        _merge_failover_stats(stats, failed_attempts)
+        if not failed or not backend_pool.has_healthy(exclude=tried) or not _can_fail_over(texts, system_prompt, backend, can_spend):
+            return batch_translated, warning_msg
+        failed_attempts.append(attempt_stats)
+
+async def translate_batch_pooled_async(
+    texts: List[str],
+    backend_pool: BackendPool,
+    system_prompt: str,
+    temperature: float = 1.3,
+    max_retries: int = 1,
+    stats: Optional[dict] = None,
+    stream: bool = False,
+    on_line: Optional[Callable[[int, str], None]] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    can_spend: Optional[Callable[[dict, str], bool]] = None
+) -> Tuple[List[str], Optional[str]]:
+    stats = stats if stats is not None else {}
+    if hedge_policy:
+        hedge_policy.window_started()
+    tried = []
+    spans = []
+    failed_attempts = []
+    while True:
+        wait_start = time.time()
+        backend = await backend_pool.acquire_async(exclude=tried)
+        spans.append(("backend_wait", wait_start, time.time(), {"backend": backend.name}))
+        tried.append(backend)
+        args = (texts, system_prompt, temperature, max_retries, stream, on_line, can_spend)
+        if hedge_policy:
+            batch_translated, warning_msg, attempt_stats, failed = await _translate_hedged_async(backend_pool, backend, hedge_policy, *args)
+        else:
+            batch_translated, warning_msg, attempt_stats, failed = await _translate_on_backend_async(backend_pool, backend, None, *args)
+        spans.extend(attempt_stats.pop("spans", []))
+        stats.clear()
+        stats.update(attempt_stats, spans=spans)
+        _merge_failover_stats(stats, failed_attempts)
+        if not failed or not backend_pool.has_healthy(exclude=tried) or not _can_fail_over(texts, system_prompt, backend, can_spend):
+            return batch_translated, warning_msg
+        failed_attempts.append(attempt_stats)
+
+async def translate_windows_async(
+    windows: Iterable[List[str]],
+    api_key: str,
+    api_base: str,
+    model: str,
+    system_prompt: str,
+    temperature: float = 1.3,
+    max_retries: int = 1,
+    concurrency: int = 8,
+    on_window_done: Optional[Callable[[int, List[str], Optional[str], float, dict], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    stream: bool = False,
+    on_line: Optional[Callable[[int, int, str], None]] = None,
+    backend_pool: Optional[BackendPool] = None,
+    hedge_policy: Optional[HedgePolicy] = None,
+    can_spend: Optional[Callable[[dict, str], bool]] = None
+) -> List[Optional[Tuple[List[str], Optional[str]]]]:
+    backend_pool = backend_pool or build_backend_pool([], api_base, api_key, model, concurrency)
+    pending = enumerate(windows)
+    results = {}
 
-    final_warning = f"⚠️ 翻译失败或行数不一致 (尝试 {max_retries + 1} 次后)"
-    return _prepare_failure_output(texts, final_warning, translated_lines if 'translated_lines' in locals() else None)
+    async def worker():
+        for index, batch_texts in pending:
+            if should_stop and should_stop():
+                return
+            stats = {}
+            batch_start_time = time.time()
+            batch_translated, warning_msg = await translate_batch_pooled_async(
+                texts=batch_texts,
+                backend_pool=backend_pool,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_retries=max_retries,
+                stats=stats,
+                stream=stream,
+                on_line=(lambda line_index, content, index=index: on_line(index, line_index, content)) if on_line else None,
+                hedge_policy=hedge_policy,
+                can_spend=can_spend
+            )
+            results[index] = (batch_translated, warning_msg)
+            if on_window_done:
+                on_window_done(index, batch_translated, warning_msg, time.time() - batch_start_time, stats)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return [results.get(i) for i in range(max(results, default=-1) + 1)]
 
 def _prepare_failure_output(original_texts, warning_prefix, partial_translations=None):
     if partial_translations is None:
@@ -96,27 +689,154 @@ def _prepare_failure_output(original_texts, warning_prefix, partial_translations
         filled_lines = [warning_prefix + r"\N" + f"[原文保留] {original_texts[0]}"] +                        [f"[原文保留] {ot}" for ot in original_texts[1:]]
     return filled_lines, warning_prefix
 
+SUMMARY_PROMPT_TEMPLATE = "你是一位字幕分析助手。请简洁扼要地总结以下字幕的主要内容和风格，控制在{length}字以内。不要加入你自己的评论。"
+
+CHUNK_SUMMARY_PROMPT_TEMPLATE = (
+    "你是一位字幕分析助手。以下是一部作品字幕的第 {part}/{total} 部分。"
+    "请简洁扼要地总结这一部分的情节、出场人物和用语风格，控制在{length}字以内。不要加入你自己的评论。"
+)
+
+REDUCE_SUMMARY_PROMPT_TEMPLATE = (
+    "你是一位字幕分析助手。以下是同一部作品字幕按时间顺序各部分的摘要。"
+    "请将它们合并为一份覆盖全片的摘要，概括主要内容、人物和风格，控制在{length}字以内。不要加入你自己的评论。"
+)
+
+SUMMARY_CHUNK_CHARS = 12000
+SUMMARY_FAN_OUT = 4
+SUMMARY_FINAL_LENGTH = 200
+
+def _chunk_texts(texts: List[str], chunk_chars: int) -> List[str]:
+    chunks = []
+    current = []
+    current_chars = 0
+    for text in texts:
+        if current and current_chars + len(text) + 1 > chunk_chars:
+            chunks.append("\n".join(current))
+            current = []
+            current_chars = 0
+        current.append(text[:chunk_chars])
+        current_chars += len(current[-1]) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def _summary_requests(texts: List[str], chunk_chars: int, final_length: int):
+    chunks = _chunk_texts(texts, chunk_chars) or [""]
+    if len(chunks) == 1:
+        return [[
+            {"role": "system", "content": SUMMARY_PROMPT_TEMPLATE.format(length=final_length)},
+            {"role": "user", "content": chunks[0]}
+        ]]
+    return [
+        [
+            {"role": "system", "content": CHUNK_SUMMARY_PROMPT_TEMPLATE.format(part=i + 1, total=len(chunks), length=final_length)},
+            {"role": "user", "content": chunk}
+        ]
+        for i, chunk in enumerate(chunks)
+    ]
+
+def _reduce_messages(partials: List[str], final_length: int):
+    combined = "\n\n".join(f"【第 {i + 1} 部分】\n{p}" for i, p in enumerate(partials))
+    return [
+        {"role": "system", "content": REDUCE_SUMMARY_PROMPT_TEMPLATE.format(length=final_length)},
+        {"role": "user", "content": combined}
+    ]
+
+def _reduce_groups(partials: List[str], chunk_chars: int) -> List[List[str]]:
+    groups = [[]]
+    group_chars = 0
+    for partial in partials:
+        if len(groups[-1]) >= 2 and group_chars + len(partial) > chunk_chars:
+            groups.append([])
+            group_chars = 0
+        groups[-1].append(partial)
+        group_chars += len(partial)
+    return groups
+
 def summarize_subtitles(
     texts: List[str],
     api_key: str,
     api_base: str,
     model: str,
-    temperature: float = 0.3
+    temperature: float = 0.3,
+    chunk_chars: int = SUMMARY_CHUNK_CHARS,
+    fan_out: int = SUMMARY_FAN_OUT,
+    final_length: int = SUMMARY_FINAL_LENGTH,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[dict] = None
 ) -> str:
-    client = openai.OpenAI(
-        base_url=api_base,
-        api_key=api_key,
-    )
-    combined_text = "\n".join(texts)
-    if len(combined_text) > 12000:
-        combined_text = combined_text[:12000]
-    prompt = "你是一位字幕分析助手。请简洁扼要地总结以下字幕的主要内容和风格，控制在200字以内。不要加入你自己的评论。"
-    response = client.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        messages=[
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": combined_text}
-        ]
-    )
-    return response.choices[0].message.content.strip()
+    client = get_client(api_base, api_key)
+    rate_limiter = get_rate_limiter(api_base, model, api_key)
+    requests = _summary_requests(texts, chunk_chars, final_length)
+    progress = {"done": 0, "total": len(requests) + (len(requests) > 1)}
+    progress_lock = threading.Lock()
+
+    def complete(messages):
+        rate_limiter.acquire(_estimate_request_tokens(messages))
+        response = client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=messages
+        )
+        with progress_lock:
+            progress["done"] += 1
+            if stats is not None:
+                _record_usage(stats, _usage_dict(response.usage))
+            if on_progress:
+                on_progress(progress["done"], progress["total"])
+        return response.choices[0].message.content.strip()
+
+    if len(requests) == 1:
+        return complete(requests[0])
+
+    with ThreadPoolExecutor(max_workers=max(1, fan_out)) as executor:
+        partials = list(executor.map(complete, requests))
+        groups = _reduce_groups(partials, chunk_chars)
+        while len(groups) > 1:
+            progress["total"] += len(groups)
+            partials = list(executor.map(lambda group: complete(_reduce_messages(group, final_length)), groups))
+            groups = _reduce_groups(partials, chunk_chars)
+    return complete(_reduce_messages(groups[0], final_length))
+
+async def summarize_subtitles_async(
+    texts: List[str],
+    client: openai.AsyncOpenAI,
+    model: str,
+    temperature: float = 0.3,
+    rate_limiter: Optional[RateLimiter] = None,
+    chunk_chars: int = SUMMARY_CHUNK_CHARS,
+    fan_out: int = SUMMARY_FAN_OUT,
+    final_length: int = SUMMARY_FINAL_LENGTH,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    stats: Optional[dict] = None
+) -> str:
+    semaphore = asyncio.Semaphore(max(1, fan_out))
+    requests = _summary_requests(texts, chunk_chars, final_length)
+    progress = {"done": 0, "total": len(requests) + (len(requests) > 1)}
+
+    async def complete(messages):
+        async with semaphore:
+            if rate_limiter:
+                await rate_limiter.acquire_async(_estimate_request_tokens(messages))
+            response = await client.chat.completions.create(
+                model=model,
+                temperature=temperature,
+                messages=messages
+            )
+        progress["done"] += 1
+        if stats is not None:
+            _record_usage(stats, _usage_dict(response.usage))
+        if on_progress:
+            on_progress(progress["done"], progress["total"])
+        return response.choices[0].message.content.strip()
+
+    if len(requests) == 1:
+        return await complete(requests[0])
+
+    partials = await asyncio.gather(*(complete(messages) for messages in requests))
+    groups = _reduce_groups(partials, chunk_chars)
+    while len(groups) > 1:
+        progress["total"] += len(groups)
+        partials = await asyncio.gather(*(complete(_reduce_messages(group, final_length)) for group in groups))
+        groups = _reduce_groups(partials, chunk_chars)
+    return await complete(_reduce_messages(groups[0], final_length))
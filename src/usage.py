@@ -0,0 +1,176 @@
+# usage.py
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+USAGE_KEYS = ("prompt_tokens", "cached_tokens", "completion_tokens")
+CATEGORIES = ("first", "retry", "hedge", "summary")
+CATEGORY_LABELS = {"first": "首次请求", "retry": "重试/补译", "hedge": "对冲请求", "summary": "摘要"}
+
+def empty_usage() -> Dict[str, int]:
+    return {key: 0 for key in USAGE_KEYS}
+
+def add_usage(total: dict, usage: dict):
+    for key in USAGE_KEYS:
+        total[key] += usage.get(key, 0)
+
+def usage_cost(usage: dict, price: Optional[dict]) -> Optional[float]:
+    # price 为每百万 tokens 的单价：{"input": ..., "cached_input": ..., "output": ...}
+    if not price:
+        return None
+    uncached = usage["prompt_tokens"] - usage["cached_tokens"]
+    cached_price = price.get("cached_input", price.get("input", 0.0))
+    return (
+        uncached * price.get("input", 0.0)
+        + usage["cached_tokens"] * cached_price
+        + usage["completion_tokens"] * price.get("output", 0.0)
+    ) / 1_000_000
+
+def format_usage(usage: dict) -> str:
+    return f"提示词 {usage['prompt_tokens']}（缓存 {usage['cached_tokens']}），输出 {usage['completion_tokens']}"
+
+class UsageLedger:
+    def __init__(self, pricing: Optional[dict] = None, max_tokens: int = 0, max_cost: float = 0.0):
+        self.pricing = pricing or {}
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.categories = {category: empty_usage() for category in CATEGORIES}
+        self.cost = 0.0
+        self.unpriced_models = set()
+        self.windows = []
+        self.reserved_tokens = 0
+        self.reserved_cost = 0.0
+        self._lock = threading.Lock()
+
+    def _price(self, model: str) -> Optional[dict]:
+        return self.pricing.get(model) or self.pricing.get("*")
+
+    def record(self, category: str, usage: dict, model: str) -> Optional[float]:
+        cost = usage_cost({**empty_usage(), **usage}, self._price(model))
+        with self._lock:
+            add_usage(self.categories[category], usage)
+            if cost is not None:
+                self.cost += cost
+            elif self.pricing and any(usage.get(key) for key in USAGE_KEYS):
+                self.unpriced_models.add(model)
+        return cost
+
+    def record_window(self, window_index: int, lines: int, stats: dict):
+        model = stats.get("model", "")
+        failover = stats.get("failover_usage", [])
+        retry = {key: stats.get(f"retry_{key}", 0) for key in USAGE_KEYS}
+        first = {key: stats.get(key, 0) - retry[key] - sum(f[key] for f in failover) for key in USAGE_KEYS}
+        costs = [self.record("first", first, model), self.record("retry", retry, model)]
+        # 切换后端前失败后端的用量按其自身模型计价，计入重试
+        for failed_usage in failover:
+            failover_usage = {key: failed_usage[key] for key in USAGE_KEYS}
+            costs.append(self.record("retry", failover_usage, failed_usage["model"]))
+            add_usage(retry, failover_usage)
+        priced = [cost for cost in costs if cost is not None]
+        with self._lock:
+            self.windows.append({
+                "window": window_index + 1,
+                "lines": lines,
+                "backend": stats.get("backend", ""),
+                "model": model,
+                "attempts": stats.get("attempts", 0),
+                "first": first,
+                "retry": retry,
+                "cost": sum(priced) if priced else None
+            })
+
+    def total(self) -> Dict[str, int]:
+        with self._lock:
+            total = empty_usage()
+            for usage in self.categories.values():
+                add_usage(total, usage)
+            return total
+
+    def total_tokens(self) -> int:
+        total = self.total()
+        return total["prompt_tokens"] + total["completion_tokens"]
+
+    # 调用方需持有 self._lock
+    def _within_budget(self, tokens: int, cost: float) -> bool:
+        if self.max_tokens:
+            used = sum(usage["prompt_tokens"] + usage["completion_tokens"] for usage in self.categories.values())
+            if used + self.reserved_tokens + tokens > self.max_tokens:
+                return False
+        return not self.max_cost or self.cost + self.reserved_cost + cost <= self.max_cost
+
+    def _estimate(self, usage: dict, model: str) -> Tuple[int, float]:
+        usage = {**empty_usage(), **usage}
+        return usage["prompt_tokens"] + usage["completion_tokens"], usage_cost(usage, self._price(model)) or 0.0
+
+    # 按估算用量检查预算：已用量、进行中窗口的预留量与本次用量之和不得超过上限
+    def can_spend(self, usage: dict, model: str) -> bool:
+        tokens, cost = self._estimate(usage, model)
+        with self._lock:
+            return self._within_budget(tokens, cost)
+
+    def try_reserve(self, usage: dict, model: str) -> Optional[Tuple[int, float]]:
+        tokens, cost = self._estimate(usage, model)
+        with self._lock:
+            if not self._within_budget(tokens, cost):
+                return None
+            self.reserved_tokens += tokens
+            self.reserved_cost += cost
+        return tokens, cost
+
+    def release(self, reservation: Tuple[int, float]):
+        with self._lock:
+            self.reserved_tokens -= reservation[0]
+            self.reserved_cost -= reservation[1]
+
+    def exceeded(self) -> bool:
+        if self.max_tokens and self.total_tokens() >= self.max_tokens:
+            return True
+        return bool(self.max_cost) and self.cost >= self.max_cost
+
+    def _cost_text(self) -> str:
+        if not self.pricing or (self.unpriced_models and not self.cost):
+            return ""
+        return f"，约 ${self.cost:.4f}"
+
+    def short_summary(self) -> str:
+        return f"已用 {self.total_tokens()} tokens{self._cost_text()}"
+
+    def describe(self) -> str:
+        total = self.total()
+        if not any(total.values()):
+            return "Token 用量：服务未返回用量信息"
+        lines = [f"Token 用量：{format_usage(total)}，合计 {self.total_tokens()}{self._cost_text()}"]
+        for category in CATEGORIES:
+            usage = self.categories[category]
+            if any(usage.values()):
+                lines.append(f"  {CATEGORY_LABELS[category]}：{format_usage(usage)}")
+        if self.unpriced_models:
+            lines.append(f"  未配置单价的模型：{', '.join(sorted(self.unpriced_models))}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            categories = {category: dict(usage) for category, usage in self.categories.items()}
+            windows = sorted(self.windows, key=lambda w: w["window"])
+        return {
+            "total": self.total(),
+            "cost": round(self.cost, 6),
+            "unpriced_models": sorted(self.unpriced_models),
+            "categories": categories,
+            "windows": windows
+        }
+
+def merge_usage_reports(reports: List[dict]) -> dict:
+    merged = {"total": empty_usage(), "cost": 0.0, "unpriced_models": [], "categories": {c: empty_usage() for c in CATEGORIES}}
+    for report in reports:
+        add_usage(merged["total"], report["total"])
+        merged["cost"] += report["cost"]
+        for category, usage in report["categories"].items():
+            add_usage(merged["categories"][category], usage)
+        merged["unpriced_models"] = sorted(set(merged["unpriced_models"]) | set(report["unpriced_models"]))
+    merged["cost"] = round(merged["cost"], 6)
+    return merged
+
+def write_usage_report(path: str, report: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,70 @@
+# conftest.py
+# 测试直接以脚本方式导入 src 与 benchmarks 下的模块，与程序运行方式一致。
+import contextlib
+import io
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import config_manager
+from bench import QuietReporter, generate_subtitles
+from mock_server import MockBehavior, MockServer
+from pipeline import apply_runtime_config, build_system_prompt, run_translation_job
+
+@pytest.fixture
+def job_config(tmp_path, monkeypatch):
+    # 每个测试使用独立的 config.json，关闭翻译记忆，断点写入临时目录
+    path = tmp_path / "config.json"
+    monkeypatch.setattr(config_manager, "CONFIG_FILE", str(path))
+
+    def write(**overrides):
+        config = {
+            "translation_memory": {"enabled": False},
+            "checkpoint_dir": str(tmp_path / "checkpoints"),
+            "http_pool": {"http2": False},
+            **overrides
+        }
+        path.write_text(json.dumps(config), encoding="utf-8")
+        apply_runtime_config(config)
+        return config
+
+    write()
+    yield write
+    apply_runtime_config({})
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**behavior):
+        server = MockServer(MockBehavior(**{"latency_median": 0.01, "latency_max": 0.05, "seed": 0, **behavior}))
+        servers.append(server.__enter__())
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
+
+@pytest.fixture
+def subtitle_file(tmp_path):
+    def make(name: str, lines: int, seed: int = 0) -> str:
+        path = str(tmp_path / name)
+        generate_subtitles(path, lines, seed)
+        return path
+    return make
+
+def run_job(api_base: str, input_path: str, output_path: str, window_size: int = 10, concurrency: int = 4, retries: int = 1, reporter=None, **options):
+    options = {
+        "use_translation_memory": False, "source_language": "英语", "target_language": "简体中文",
+        "resume": False, **options
+    }
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_translation_job(input_path, output_path, window_size, 1.0, api_base, "sk-test", "mock-model",
+                                   build_system_prompt("英语", "简体中文"), retries, concurrency,
+                                   reporter=reporter or QuietReporter(), **options)
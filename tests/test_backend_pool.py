@@ -0,0 +1,82 @@
+from backend_pool import build_backend_pool
+from hedging import HedgePolicy
+from pipeline import build_system_prompt
+from rate_limiter import configure_rate_limits, get_rate_limiter
+from translator import _acquire_hedge_backend, _backend_rate_limiter, translate_batch_pooled
+
+PROMPT = build_system_prompt("英语", "简体中文")
+TEXTS = ["Where are we going?", "To the harbour.", "Is the captain there?"]
+
+def test_rate_limiters_are_separate_per_api_key(job_config):
+    configure_rate_limits([{"api_base": "*", "model": "*", "rpm": 100}])
+    pool = build_backend_pool([
+        {"name": "a", "api_key": "sk-a", "rpm": 10, "tpm": 5000},
+        {"name": "b", "api_key": "sk-b"},
+        {"name": "c", "api_key": "sk-b"}
+    ], "http://localhost/v1", "sk-default", "mock-model", 4)
+    a, b, c = [_backend_rate_limiter(backend) for backend in pool.backends]
+
+    assert a is not b
+    assert b is c
+    assert (a.rpm, a.tpm) == (10, 5000)
+    assert b.rpm == 100
+    assert get_rate_limiter("http://localhost/v1", "mock-model", "sk-b") is b
+
+def test_failed_backend_fails_over_and_keeps_counts(mock_server, job_config):
+    broken = mock_server(rate_500=1.0)
+    healthy = mock_server()
+    # 权重更高的后端先被选中
+    pool = build_backend_pool([
+        {"name": "broken", "api_base": broken.api_base, "weight": 10},
+        {"name": "healthy", "api_base": healthy.api_base}
+    ], "", "sk-test", "mock-model", 2)
+    stats = {}
+    translated, warning = translate_batch_pooled(TEXTS, pool, PROMPT, max_retries=0, stats=stats)
+
+    assert warning is None
+    assert translated == [f"译：{text}" for text in TEXTS]
+    assert stats["backend"] == "healthy"
+    assert stats["attempts"] == 2
+    assert stats["errors"] == 1
+    assert [b.failed for b in pool.backends] == [1, 0]
+    assert all(b.outstanding == 0 for b in pool.backends)
+
+def test_hedge_never_lands_on_primary_or_busy_backend():
+    policy = HedgePolicy(max_hedge_ratio=1.0)
+    policy.window_started()
+    single = build_backend_pool([], "http://localhost/v1", "sk-test", "mock-model", 4)
+    primary = single.try_acquire()
+
+    assert _acquire_hedge_backend(single, policy, primary, TEXTS, PROMPT, None) is None
+    assert policy.hedges == 0
+
+    pool = build_backend_pool([{"name": "a", "max_concurrency": 1}, {"name": "b", "max_concurrency": 1}],
+                              "http://localhost/v1", "sk-test", "mock-model", 1)
+    primary = pool.try_acquire()
+    other = pool.try_acquire()
+    assert _acquire_hedge_backend(pool, policy, primary, TEXTS, PROMPT, None) is None
+    assert other.outstanding == 1 and primary.outstanding == 1
+
+    pool.release(other, 0.1, 1, True)
+    assert _acquire_hedge_backend(pool, policy, primary, TEXTS, PROMPT, None) is other
+    assert policy.hedges == 1
+
+def test_sync_hedge_loser_usage_is_collected(mock_server, job_config):
+    slow = mock_server(latency="fixed", latency_median=0.6, latency_max=1.0)
+    fast = mock_server(latency="fixed", latency_median=0.01)
+    pool = build_backend_pool([
+        {"name": "slow", "api_base": slow.api_base, "weight": 10},
+        {"name": "fast", "api_base": fast.api_base}
+    ], "", "sk-test", "mock-model", 2)
+    policy = HedgePolicy(min_samples=1, min_delay=0.05, max_hedge_ratio=1.0)
+    policy.record(0.01, 1)
+    stats = {}
+    translated, warning = translate_batch_pooled(TEXTS, pool, PROMPT, stats=stats, hedge_policy=policy)
+
+    assert warning is None
+    assert stats["backend"] == "fast" and stats["hedge_won"]
+    assert policy.drain_loser_stats() == []
+    policy.wait_for_losers()
+    losers = policy.drain_loser_stats()
+    assert [loser["backend"] for loser in losers] == ["slow"]
+    assert losers[0]["prompt_tokens"] > 0
@@ -0,0 +1,70 @@
+import itertools
+
+import metrics
+import pipeline
+from bench import QuietReporter
+from conftest import run_job
+
+class ProgressReporter(QuietReporter):
+    def __init__(self):
+        super().__init__()
+        self.peak = 0
+
+    def progress(self, value, maximum):
+        self.peak = max(self.peak, value)
+
+def test_hedged_streaming_job_counts_each_line_once(mock_server, job_config, subtitle_file, tmp_path):
+    server = mock_server(tokens_per_second=2000)
+    # 窗口按总并发占满所有后端，只有末尾的窗口有空闲后端可对冲；让最后 4 个窗口的请求变慢
+    calls = itertools.count(1)
+    server.behavior.sample_latency = lambda: 1.0 if 17 <= next(calls) <= 20 else 0.01
+    job_config(backends=[{"name": "a", "max_concurrency": 4}, {"name": "b", "max_concurrency": 4}],
+               hedging={"min_samples": 3, "min_delay": 0.05, "max_hedge_ratio": 1.0, "percentile": 0.5})
+    input_path = subtitle_file("hedge.srt", 200, seed=3)
+    reporter = ProgressReporter()
+    result = run_job(server.api_base, input_path, str(tmp_path / "hedge_out.srt"), reporter=reporter,
+                     stream_output=True, hedge_requests=True)
+
+    assert result["status"] == "completed"
+    assert reporter.peak == result["lines"] == 200
+    # 服务端收到、但不属于任何窗口最终结果的请求即对冲中落败的请求，其用量须计入账本
+    loser_requests = server.behavior.counters["requests"] - sum(w["attempts"] for w in result["usage"]["windows"])
+    assert loser_requests > 0
+    assert result["usage"]["categories"]["hedge"]["prompt_tokens"] > 0
+
+def test_translation_memory_hits_across_deep_summaries(mock_server, subtitle_file, job_config, tmp_path, monkeypatch):
+    job_config(translation_memory={"enabled": True, "path": str(tmp_path / "memory.db")})
+    input_path = subtitle_file("memory.srt", 60)
+
+    first = run_job(mock_server(seed=1).api_base, input_path, str(tmp_path / "first.srt"),
+                    use_translation_memory=True, deep_summary_model="mock-model")
+    # 第二次的摘要内容不同，翻译记忆仍应全部命中
+    monkeypatch.setattr(pipeline, "run_summary_stage", lambda *args: "另一段内容摘要。")
+    second = run_job(mock_server(seed=2).api_base, input_path, str(tmp_path / "second.srt"),
+                     use_translation_memory=True, deep_summary_model="mock-model")
+
+    assert first["status"] == second["status"] == "completed"
+    assert first["api_lines"] > 0
+    assert second["api_lines"] == 0
+
+def test_metrics_count_memory_lookups_and_summary_tokens(mock_server, subtitle_file, job_config, tmp_path):
+    job_config(translation_memory={"enabled": True, "path": str(tmp_path / "memory.db")})
+    server = mock_server()
+    input_path = subtitle_file("metrics.srt", 60)
+
+    def counter(metric, **labels):
+        return metric._values.get(tuple(sorted(labels.items())), 0)
+
+    summary_prompt = counter(metrics.tokens_total, type="prompt", model="summary-model")
+    first = run_job(server.api_base, input_path, str(tmp_path / "first.srt"),
+                    use_translation_memory=True, deep_summary_model="summary-model")
+    hits, misses = counter(metrics.memory_lookups_total, result="hit"), counter(metrics.memory_lookups_total, result="miss")
+    second = run_job(server.api_base, input_path, str(tmp_path / "second.srt"),
+                     use_translation_memory=True, deep_summary_model="summary-model")
+
+    assert first["status"] == second["status"] == "completed"
+    assert counter(metrics.memory_lookups_total, result="hit") - hits == first["api_lines"]
+    assert counter(metrics.memory_lookups_total, result="miss") == misses
+    summary_usage = sum(job["usage"]["categories"]["summary"]["prompt_tokens"] for job in (first, second))
+    assert summary_usage > 0
+    assert counter(metrics.tokens_total, type="prompt", model="summary-model") - summary_prompt == summary_usage
@@ -0,0 +1,46 @@
+import pytest
+
+from preprocess import deduplicate_texts, expand_translations, strip_markup, restore_markup
+
+ROUND_TRIP = [
+    r"{\pos(10,20)\fad(100,100)}Hello {\i1}world{\i0}!",
+    r"First line\NSecond line",
+    r"\NLeading break",
+    r"Trailing break\N",
+    r"soft\nbreak here",
+    r"{\an8}Top\N{\i1}italic second{\i0}",
+    r"{\b1}Bold{\b0}\N{\i1}Italic{\i0}",
+    r"- Who?\N- Me.",
+    r"{\k20}ka{\k30}ra",
+    r"A\hB",
+    "plain text"
+]
+
+@pytest.mark.parametrize("text", ROUND_TRIP)
+def test_unchanged_translation_restores_original(text):
+    plain, markup = strip_markup(text)
+    assert restore_markup(plain, markup) == text
+
+def test_placeholders_replace_inline_tags():
+    plain, markup = strip_markup(r"{\pos(10,20)}Hello {\i1}world{\i0}!")
+    assert plain == "Hello {1}world{2}!"
+    assert restore_markup("你好，{1}世界{2}！", markup) == r"{\pos(10,20)}你好，{\i1}世界{\i0}！"
+
+def test_lost_placeholders_and_breaks_are_reinserted():
+    plain, markup = strip_markup(r"{\an8}Top line,\N{\i1}second line{\i0}")
+    assert plain == "Top line, {1}second line"
+    restored = restore_markup("顶部这一行，第二行", markup)
+    assert restored.startswith(r"{\an8}")
+    assert restored.count(r"\N") == 1
+    assert r"{\i1}" in restored and r"{\i0}" in restored
+
+def test_edge_breaks_stay_outside_translation():
+    plain, markup = strip_markup(r"\N\NShout\N")
+    assert plain == "Shout"
+    assert restore_markup("喊", markup) == r"\N\N喊\N"
+
+def test_deduplicate_round_trip():
+    texts = ["Hi", "Bye", " hi ", "Hi", "Bye"]
+    canonical, occurrence = deduplicate_texts(texts)
+    assert [texts[i] for i in canonical] == ["Hi", "Bye", " hi "]
+    assert expand_translations(["嗨", "再见", "嗨 "], occurrence) == ["嗨", "再见", "嗨 ", "嗨", "再见"]
@@ -0,0 +1,133 @@
+import pysubs2
+import pytest
+
+from subtitle_parser import load_subtitles, save_subtitles, select_translatable_events
+from subtitle_stream import _srt_output_text, _srt_timestamp, load_subtitles_streaming, save_subtitles_streaming
+
+SRT = """1
+00:00:01,000 --> 00:00:02,000
+<i>Hello</i> there
+second line
+
+2
+00:00:03,000 --> 00:00:04,000
+
+3
+00:00:05,000 --> 00:00:06,000
+<font color="red">Red</font> <b>bold</b>
+
+"""
+
+ASS_EXTRA_EVENTS = (
+    "Dialogue: 0,0:00:00.00,0:00:01.00,Default,Bob,0,0,0,,{\\k20}ka{\\k30}ra\n"
+    "Comment: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,note, with comma\n"
+    "Dialogue: 0,0:00:00.00,0:00:01.00,Sign,,0,0,0,,{\\p1}m 0 0 l 1 1{\\p0}\n"
+)
+
+ASS_REORDERED = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1
+
+[Events]
+Format: Start, End, Layer, Name, Style, Text
+Dialogue: 0:00:01.00,0:00:02.50,1,Anna,Default,Hi, there
+Dialogue: 0:00:03.00,0:00:04.00,0,,Default,{\\i1}Bye{\\i0}
+"""
+
+ASS_FEWER_FIELDS = ASS_REORDERED.replace("Format: Start, End, Layer, Name, Style, Text", "Format: Start, End, Style, Text").replace(
+    "0:00:01.00,0:00:02.50,1,Anna,Default,", "0:00:01.00,0:00:02.50,Default,").replace("0:00:04.00,0,,Default,", "0:00:04.00,Default,")
+
+def _event_tuples(path):
+    return [(e.type, e.start, e.end, e.layer, e.style, e.name, e.text) for e in pysubs2.load(path)]
+
+@pytest.fixture
+def samples(tmp_path, subtitle_file):
+    (tmp_path / "small.srt").write_text(SRT, encoding="utf-8")
+    ass_path = subtitle_file("generated.ass", 300, 1)
+    with open(ass_path, encoding="utf-8") as fp:
+        content = fp.read().replace("[Events]", "[Fonts]\nfontname: x.ttf\nABCDEF\n\n[Events]")
+    with open(ass_path, "w", encoding="utf-8") as fp:
+        fp.write(content + ASS_EXTRA_EVENTS)
+    return [str(tmp_path / "small.srt"), subtitle_file("generated.srt", 300, 1), ass_path]
+
+def test_streaming_reader_matches_pysubs2(samples):
+    for path in samples:
+        subs, texts = load_subtitles(path, use_cache=False)
+        selected, skipped = select_translatable_events(subs)
+        document, streamed_texts = load_subtitles_streaming(path, 7, {})
+
+        assert len(document) == len(subs), path
+        assert document.line_indices == selected, path
+        assert document.skipped_events == skipped, path
+        assert streamed_texts == [texts[i] for i in selected], path
+        assert [(e.type, e.start, e.end, e.style, e.name, e.text) for e in document] == \
+               [(e.type, e.start, e.end, e.style, e.name, e.text) for e in subs], path
+
+def test_streaming_reader_without_filter_keeps_every_event(samples):
+    _, texts = load_subtitles(samples[2], use_cache=False)
+    document, streamed_texts = load_subtitles_streaming(samples[2], 7)
+
+    assert streamed_texts == texts
+    assert document.line_indices == list(range(len(texts)))
+
+# pysubs2 忽略 [Events] 的 Format 行，这里直接核对按声明顺序解析出的字段
+@pytest.mark.parametrize("content, name", [(ASS_REORDERED, "Anna"), (ASS_FEWER_FIELDS, "")])
+def test_events_format_line_is_followed(tmp_path, content, name):
+    path = tmp_path / "custom.ass"
+    path.write_text(content, encoding="utf-8")
+    document, texts = load_subtitles_streaming(str(path), 7, {})
+    event = next(iter(document))
+
+    assert texts == ["Hi, there", "{\\i1}Bye{\\i0}"]
+    assert (event.start, event.end, event.style, event.name) == (1000, 2500, "Default", name)
+
+    output_path = str(tmp_path / "custom_out.ass")
+    save_subtitles_streaming(document, output_path, ["你好", "再见"], 2, document.line_indices)
+    with open(output_path, encoding="utf-8") as fp:
+        output = fp.read()
+    assert output == content.replace("Hi, there", "你好").replace("{\\i1}Bye{\\i0}", "再见")
+
+def test_streaming_writer_matches_pysubs2(samples, tmp_path):
+    for path in samples:
+        ext = path[-4:]
+        subs, texts = load_subtitles(path, use_cache=False)
+        selected, _ = select_translatable_events(subs)
+        translated = [f"译{i}：{texts[j]}" for i, j in enumerate(selected)]
+        reference_path = str(tmp_path / f"reference{ext}")
+        streamed_path = str(tmp_path / f"streamed{ext}")
+        save_subtitles(subs, reference_path, list(translated), len(selected), selected)
+        document, _ = load_subtitles_streaming(path, 7, {})
+        save_subtitles_streaming(document, streamed_path, list(translated), len(selected), document.line_indices)
+
+        assert _event_tuples(streamed_path) == _event_tuples(reference_path), path
+        if ext == ".srt":
+            with open(reference_path, encoding="utf-8") as ref, open(streamed_path, encoding="utf-8") as out:
+                assert out.read() == ref.read(), path
+
+@pytest.mark.parametrize("text", [
+    "plain",
+    "two\\Nlines",
+    "soft\\nbreak\\hspace",
+    "{\\i1}italic{\\i0} and {\\b1}bold{\\b0}",
+    "{\\u1}{\\s1}both{\\r} reset",
+    "{\\an8}positioned",
+    "  padded\\N\\N  ",
+])
+def test_srt_output_text_matches_pysubs2(text):
+    subs = pysubs2.SSAFile()
+    subs.append(pysubs2.SSAEvent(start=1500, end=3_723_004, text=text))
+    expected = subs.to_string("srt")
+
+    assert f"1\n{_srt_timestamp(1500)} --> {_srt_timestamp(3_723_004)}\n{_srt_output_text(text)}\n\n" == expected
+
+def test_cross_format_output_falls_back_to_pysubs2(samples, tmp_path):
+    document, _ = load_subtitles_streaming(samples[2], 7)
+    output_path = str(tmp_path / "converted.srt")
+    save_subtitles_streaming(document, output_path, ["译"] * 10, 10, list(range(10)))
+    events = pysubs2.load(output_path)
+
+    assert [event.text for event in events[:10]] == ["译"] * 10
+    assert events[10].text == pysubs2.load(samples[2])[10].text
@@ -0,0 +1,74 @@
+import asyncio
+
+from pipeline import build_system_prompt
+from rate_limiter import RateLimiter
+from translator import _run_attempts, _translation_attempts, get_async_client, translate_batch, translate_batch_async
+
+PROMPT = build_system_prompt("英语", "简体中文")
+TEXTS = ["Where are we going?", "To the harbour.", "Is the captain there?", "Nobody knows.", "Then let's hurry."]
+
+def _reply(content: str, prompt_tokens: int = 10):
+    return {"content": content, "finish_reason": "stop", "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 5, "cached_tokens": 0}}
+
+def test_retry_sends_only_missing_lines():
+    requests = []
+    replies = iter([
+        _reply("[1] 我们去哪？\n[2] 去港口。\n[4] 没人知道。\n[5] 那就快点。"),
+        _reply("[1] 船长在吗？", prompt_tokens=7)
+    ])
+
+    def request(payload):
+        requests.append(payload)
+        return next(replies)
+
+    stats = {}
+    translated, warning = _run_attempts(_translation_attempts(TEXTS, PROMPT, 2, stats, RateLimiter()), request)
+
+    assert warning is None
+    assert translated == ["我们去哪？", "去港口。", "船长在吗？", "没人知道。", "那就快点。"]
+    assert requests[1]["line_indices"] == [2]
+    repair = requests[1]["messages"][1]["content"]
+    assert "[1] Is the captain there?" in repair
+    assert "To the harbour. => 去港口。" in repair
+    assert stats["attempts"] == 2
+    assert stats["prompt_tokens"] == 17
+    assert stats["retry_prompt_tokens"] == 7
+
+def test_exhausted_retries_keep_partial_translation():
+    replies = iter([_reply("[1] 我们去哪？"), _reply("")])
+    stats = {}
+    translated, warning = _run_attempts(
+        _translation_attempts(TEXTS[:2], PROMPT, 1, stats, RateLimiter()),
+        lambda payload: next(replies)
+    )
+
+    assert warning
+    assert translated[0].endswith("我们去哪？")
+    assert translated[1] == "[原文保留] To the harbour."
+    assert stats["attempts"] == 2
+
+def test_dropped_lines_are_repaired_against_mock_server(mock_server, job_config):
+    server = mock_server(drop_line=0.3, seed=3)
+    texts = [f"Line number {i}" for i in range(20)]
+    stats = {}
+    translated, warning = translate_batch(texts, "sk-test", server.api_base, "mock-model", PROMPT, max_retries=6, stats=stats)
+
+    assert warning is None
+    assert translated == [f"译：{text}" for text in texts]
+    assert server.behavior.counters["dropped_lines"] > 0
+    assert stats["attempts"] > 1
+
+def test_streaming_and_async_match_blocking_path(mock_server, job_config):
+    server = mock_server()
+    blocking, _ = translate_batch(TEXTS, "sk-test", server.api_base, "mock-model", PROMPT)
+    streamed_lines = {}
+    streamed, _ = translate_batch(TEXTS, "sk-test", server.api_base, "mock-model", PROMPT, stream=True,
+                                  on_line=lambda index, content: streamed_lines.setdefault(index, content))
+
+    async def run_async():
+        return await translate_batch_async(TEXTS, get_async_client(server.api_base, "sk-test"), "mock-model", PROMPT)
+
+    async_translated, _ = asyncio.run(run_async())
+
+    assert streamed == blocking == async_translated
+    assert [streamed_lines[i] for i in range(len(TEXTS))] == blocking
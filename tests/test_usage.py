@@ -0,0 +1,80 @@
+import os
+
+import pysubs2
+
+from translator import _merge_failover_stats
+from usage import UsageLedger
+from conftest import run_job
+
+PRICING = {"cheap": {"input": 1.0, "output": 2.0}, "dear": {"input": 10.0, "output": 20.0}}
+
+def test_failover_usage_is_billed_as_retry_on_its_own_model():
+    stats = {"model": "cheap", "prompt_tokens": 1000, "completion_tokens": 500, "cached_tokens": 0,
+             "retry_prompt_tokens": 200, "retry_completion_tokens": 100, "attempts": 2}
+    _merge_failover_stats(stats, [{"model": "dear", "prompt_tokens": 300, "completion_tokens": 0, "cached_tokens": 0, "attempts": 1, "errors": 1}])
+
+    assert stats["attempts"] == 3 and stats["errors"] == 1
+    assert stats["prompt_tokens"] == 1300
+    ledger = UsageLedger(PRICING)
+    ledger.record_window(0, 10, stats)
+
+    assert ledger.categories["first"] == {"prompt_tokens": 800, "cached_tokens": 0, "completion_tokens": 400}
+    assert ledger.categories["retry"] == {"prompt_tokens": 500, "cached_tokens": 0, "completion_tokens": 100}
+    assert ledger.total_tokens() == 1800
+    expected = (1000 * 1.0 + 500 * 2.0 + 300 * 10.0) / 1_000_000
+    assert abs(ledger.cost - expected) < 1e-12
+    assert abs(ledger.windows[0]["cost"] - expected) < 1e-12
+    assert ledger.unpriced_models == set()
+
+def test_unpriced_models_only_reported_when_pricing_configured():
+    stats = {"model": "other", "prompt_tokens": 10, "completion_tokens": 5}
+    priced = UsageLedger(PRICING)
+    priced.record_window(0, 1, stats)
+    unpriced = UsageLedger({})
+    unpriced.record_window(0, 1, stats)
+
+    assert priced.unpriced_models == {"other"}
+    assert unpriced.unpriced_models == set()
+    assert unpriced.windows[0]["cost"] is None
+
+def test_reservations_count_against_budget_until_released():
+    ledger = UsageLedger(max_tokens=100)
+    ledger.record("first", {"prompt_tokens": 30, "completion_tokens": 10}, "cheap")
+    reservation = ledger.try_reserve({"prompt_tokens": 40, "completion_tokens": 10}, "cheap")
+
+    assert reservation == (50, 0.0)
+    assert ledger.can_spend({"prompt_tokens": 10}, "cheap")
+    assert not ledger.can_spend({"prompt_tokens": 11}, "cheap")
+    assert ledger.try_reserve({"prompt_tokens": 20}, "cheap") is None
+    ledger.release(reservation)
+    assert ledger.reserved_tokens == 0
+    assert ledger.can_spend({"prompt_tokens": 60}, "cheap")
+
+def test_cost_budget_uses_model_pricing():
+    ledger = UsageLedger(PRICING, max_cost=0.01)
+
+    assert ledger.try_reserve({"prompt_tokens": 900}, "dear") is not None
+    assert not ledger.can_spend({"prompt_tokens": 200}, "dear")
+    assert ledger.can_spend({"prompt_tokens": 200}, "cheap")
+
+def test_budget_stop_saves_partial_and_resume_completes(mock_server, subtitle_file, job_config, tmp_path):
+    server = mock_server()
+    input_path = subtitle_file("budget.srt", 200)
+    output_path = str(tmp_path / "budget_out.srt")
+    stopped = run_job(server.api_base, input_path, output_path, resume=True, budget={"max_tokens": 1500})
+
+    assert stopped["status"] == "budget_exceeded"
+    assert stopped["output_path"].endswith("_partial.srt") and os.path.exists(stopped["output_path"])
+    assert stopped["usage"]["total"]["prompt_tokens"] + stopped["usage"]["total"]["completion_tokens"] <= 1500
+    assert 0 < stopped["api_lines"] < 200
+    assert not os.path.exists(output_path)
+
+    requests_before = server.behavior.counters["requests"]
+    resumed = run_job(server.api_base, input_path, output_path, resume=True)
+
+    assert resumed["status"] == "completed"
+    assert resumed["api_lines"] == 200 - stopped["api_lines"]
+    assert server.behavior.counters["requests"] - requests_before < 20
+    texts = [event.text for event in pysubs2.load(output_path)]
+    assert len(texts) == 200
+    assert all(text.startswith("译：") for text in texts)